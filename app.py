@@ -4,20 +4,33 @@ Efteling Height Requirements Web Server
 Serves attraction data with nice HTML/CSS interface
 """
 
-import json
+import hashlib
+import mimetypes
 import os
+import time
 from datetime import datetime
 from pathlib import Path
-from flask import Flask, render_template_string, jsonify, request
+from statistics import median
+from urllib.parse import urlsplit
+from flask import Flask, Response, abort, render_template_string, jsonify, request, send_from_directory, stream_with_context
 
-app = Flask(__name__)
+from cache import ResponseCache
+from compression import DYNAMIC_LEVELS, MIN_SIZE, WORKER_LEVELS, PreparedBody, compress, compress_stream, is_compressible, negotiate
+from serialization import get_codec
+from rules import MAX_HEIGHT, MIN_HEIGHT
+from model import ACCESS_BITS, ACCESS_FLAGS, CATEGORIES, WHEELCHAIR_VALUES, Attraction, Snapshot, merge_changes, wheelchair_mask
+from shared import SNAPSHOT_CHANNEL, get_shared, load_shared_snapshot, shared_generation
+from storage import SCRAPE_RUN_LIMIT, PublishedSnapshot, get_storage, parse_timestamp, published_snapshot_key
+
+# /static is served by static_asset() below, with content-hashed names
+app = Flask(__name__, static_folder=None)
 
 # Security headers
 @app.after_request
 def add_security_headers(response):
     """Add security headers to all responses"""
     # Prevent XSS attacks
-    response.headers['Content-Security-Policy'] = "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; font-src 'self' https://fonts.gstatic.com; img-src 'self' data:;"
+    response.headers['Content-Security-Policy'] = "default-src 'self'; script-src 'self'; style-src 'self'; font-src 'self'; img-src 'self' data:;"
     # Prevent clickjacking
     response.headers['X-Frame-Options'] = 'DENY'
     # Prevent MIME-sniffing
@@ -30,372 +43,72 @@ def add_security_headers(response):
     response.headers['Permissions-Policy'] = 'geolocation=(), microphone=(), camera=()'
     return response
 
-DATA_DIR = Path("/app/data")
-DATA_FILE = DATA_DIR / "attractions.json"
+STATIC_DIR = Path(__file__).parent / "static"
+# Assets change only with a new deploy, so they are cached for a year under a content-hashed name
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+
+def _asset_bytes(name, assets):
+    """Content of a static asset, stylesheets pointing at the hashed fonts"""
+    data = (STATIC_DIR / name).read_bytes()
+    if name.endswith('.css'):
+        for font, hashed in assets.items():
+            if font.startswith('fonts/'):
+                data = data.replace(f"/static/{font}".encode(), f"/static/{hashed}".encode())
+    return data
+
+
+def _hash_assets():
+    """Map app.css -> app.<sha256 prefix>.css for every top-level static file and font"""
+    assets = {}
+    # Fonts first, so a new font also changes the hash of the stylesheet naming it
+    for path in sorted(STATIC_DIR.glob('fonts/*.woff2')) + sorted(STATIC_DIR.glob('*.*')):
+        name = path.relative_to(STATIC_DIR).as_posix()
+        digest = hashlib.sha256(_asset_bytes(name, assets)).hexdigest()[:12]
+        assets[name] = path.with_name(f"{path.stem}.{digest}{path.suffix}").relative_to(STATIC_DIR).as_posix()
+    return assets
+
+
+ASSETS = _hash_assets()
+HASHED_ASSETS = {hashed: name for name, hashed in ASSETS.items()}
 
-HTML_TEMPLATE = """
+
+@app.template_global()
+def asset_url(name):
+    """URL of a static asset that changes whenever its content does"""
+    return f"/static/{ASSETS.get(name, name)}"
+
+
+# name -> PreparedBody; assets only change with a deploy, so this is never cleared
+_static_bodies = {}
+
+
+@app.route('/static/<path:filename>')
+def static_asset(filename):
+    """Content-hashed css/js (precompressed) and self-hosted fonts, all immutable"""
+    name = HASHED_ASSETS.get(filename)
+    if name is None:
+        abort(404)
+    if name.startswith('fonts/'):
+        # woff2 is already brotli compressed
+        response = send_from_directory(STATIC_DIR, name, max_age=ASSET_MAX_AGE)
+    else:
+        body = _static_bodies.get(name)
+        if body is None:
+            body = _static_bodies[name] = PreparedBody.build(_asset_bytes(name, ASSETS), WORKER_LEVELS)
+        response = prepared_response(body, mimetype=mimetypes.guess_type(name)[0])
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response
+
+PAGE_HEAD = """
 <!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Efteling Height Requirements</title>
-    <link href="https://fonts.googleapis.com/css2?family=Quicksand:wght@400;500;600;700&display=swap" rel="stylesheet">
-    <style>
-        :root {
-            --efteling-green: #1a5f2a;
-            --efteling-gold: #c9a227;
-            --efteling-dark: #0d2818;
-            --efteling-light: #f5f0e6;
-            --success: #22c55e;
-            --warning: #f59e0b;
-            --danger: #ef4444;
-            --purple: #8b5cf6;
-        }
-        
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        
-        body {
-            font-family: 'Quicksand', sans-serif;
-            background: linear-gradient(135deg, var(--efteling-dark) 0%, var(--efteling-green) 100%);
-            min-height: 100vh;
-            color: var(--efteling-light);
-        }
-        
-        .container { max-width: 1200px; margin: 0 auto; padding: 20px; }
-        
-        header {
-            text-align: center;
-            padding: 40px 20px;
-            background: rgba(0,0,0,0.3);
-            border-radius: 20px;
-            margin-bottom: 30px;
-        }
-        
-        h1 {
-            font-size: 2.5rem;
-            color: var(--efteling-gold);
-            text-shadow: 2px 2px 4px rgba(0,0,0,0.5);
-            margin-bottom: 10px;
-        }
-        
-        .subtitle { font-size: 1.1rem; opacity: 0.9; }
-        
-        .stats {
-            display: flex;
-            justify-content: center;
-            gap: 20px;
-            margin-top: 15px;
-            flex-wrap: wrap;
-        }
-        
-        .stat-badge {
-            background: rgba(255,255,255,0.15);
-            padding: 8px 16px;
-            border-radius: 20px;
-            font-size: 0.9rem;
-        }
-        
-        .height-selector {
-            display: flex;
-            justify-content: center;
-            gap: 10px;
-            margin-bottom: 20px;
-            flex-wrap: wrap;
-        }
-        
-        .height-btn {
-            padding: 12px 24px;
-            font-size: 1.1rem;
-            font-weight: 600;
-            border: none;
-            border-radius: 50px;
-            cursor: pointer;
-            transition: all 0.3s ease;
-            font-family: inherit;
-            background: rgba(255,255,255,0.2);
-            color: white;
-        }
-        
-        .height-btn:hover { transform: scale(1.05); background: rgba(255,255,255,0.3); }
-        .height-btn.active { background: var(--efteling-gold); color: var(--efteling-dark); transform: scale(1.1); box-shadow: 0 0 0 3px white; }
-        
-        .hint { text-align: center; margin-bottom: 25px; opacity: 0.8; font-size: 0.95rem; }
-        
-        .results { display: none; }
-        .results.active { display: block; }
-        
-        .summary-cards {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(150px, 1fr));
-            gap: 15px;
-            margin-bottom: 25px;
-        }
-        
-        .summary-card {
-            background: rgba(255,255,255,0.15);
-            border-radius: 15px;
-            padding: 15px;
-            text-align: center;
-        }
-        
-        .summary-number { font-size: 2.5rem; font-weight: 700; color: var(--efteling-gold); }
-        .summary-label { font-size: 0.85rem; opacity: 0.9; }
-        
-        .category {
-            background: rgba(255,255,255,0.1);
-            border-radius: 15px;
-            padding: 20px;
-            margin-bottom: 20px;
-            backdrop-filter: blur(10px);
-        }
-        
-        .category h2 {
-            display: flex;
-            align-items: center;
-            gap: 10px;
-            margin-bottom: 15px;
-            font-size: 1.3rem;
-        }
-        
-        .category-icon {
-            width: 36px;
-            height: 36px;
-            border-radius: 50%;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            font-size: 1.2rem;
-        }
-        
-        .category.available .category-icon { background: var(--success); }
-        .category.companion .category-icon { background: var(--warning); }
-        .category.unavailable .category-icon { background: var(--danger); }
-        
-        .attractions-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fill, minmax(280px, 1fr));
-            gap: 12px;
-        }
-        
-        .attraction-card {
-            background: rgba(255,255,255,0.95);
-            color: var(--efteling-dark);
-            border-radius: 12px;
-            padding: 15px;
-            transition: all 0.2s ease;
-            text-decoration: none;
-            display: block;
-            cursor: pointer;
-            position: relative;
-        }
-        
-        .attraction-card:hover {
-            transform: translateY(-4px);
-            box-shadow: 0 8px 25px rgba(0,0,0,0.3);
-        }
-        
-        .attraction-card::after {
-            content: '↗';
-            position: absolute;
-            top: 10px;
-            right: 12px;
-            opacity: 0.3;
-            font-size: 1rem;
-            transition: opacity 0.2s;
-        }
-        
-        .attraction-card:hover::after { opacity: 1; }
-        
-        .attraction-name {
-            font-weight: 700;
-            font-size: 1.05rem;
-            margin-bottom: 4px;
-            color: var(--efteling-green);
-            padding-right: 20px;
-        }
-        
-        .attraction-type {
-            font-size: 0.8rem;
-            color: #666;
-            margin-bottom: 8px;
-        }
-        
-        .attraction-badges {
-            display: flex;
-            flex-wrap: wrap;
-            gap: 6px;
-            margin-bottom: 8px;
-        }
-        
-        .badge {
-            display: inline-block;
-            padding: 3px 8px;
-            border-radius: 12px;
-            font-size: 0.75rem;
-            font-weight: 600;
-        }
-        
-        .badge-height { background: #dbeafe; color: #1e40af; }
-        .badge-companion { background: #fef3c7; color: #92400e; }
-        .badge-age { background: #f3e8ff; color: #7c3aed; }
-        .badge-none { background: #d1fae5; color: #065f46; }
-        
-        .attraction-notes {
-            font-size: 0.8rem;
-            color: #555;
-            font-style: italic;
-            line-height: 1.3;
-        }
-        
-        .section-title {
-            color: var(--efteling-gold);
-            margin: 40px 0 20px;
-            text-align: center;
-            font-size: 1.5rem;
-        }
-        
-        .shows-section {
-            background: linear-gradient(135deg, rgba(139, 92, 246, 0.2) 0%, rgba(139, 92, 246, 0.1) 100%);
-            border-radius: 15px;
-            padding: 25px;
-            margin-top: 30px;
-        }
-        
-        .shows-section h2 { color: var(--efteling-gold); margin-bottom: 15px; text-align: center; }
-        
-        .show-card { border-left: 4px solid var(--purple); }
-        
-        table {
-            width: 100%;
-            border-collapse: collapse;
-            background: rgba(255,255,255,0.95);
-            border-radius: 12px;
-            overflow: hidden;
-            font-size: 0.9rem;
-        }
-        
-        th, td { padding: 10px 12px; text-align: left; color: var(--efteling-dark); }
-        th { background: var(--efteling-green); color: white; font-weight: 600; }
-        tr:nth-child(even) { background: rgba(0,0,0,0.03); }
-        tr:hover { background: rgba(201, 162, 39, 0.15); }
-        
-        .clickable-row { cursor: pointer; }
-        
-        .external-link {
-            color: var(--efteling-green);
-            text-decoration: none;
-            font-weight: 600;
-        }
-        
-        .external-link:hover { text-decoration: underline; }
-        
-        .sources-section {
-            background: rgba(0,0,0,0.3);
-            border-radius: 15px;
-            padding: 25px;
-            margin-top: 40px;
-        }
-        
-        .sources-section h2 { color: var(--efteling-gold); margin-bottom: 15px; }
-        
-        .source-item {
-            display: flex;
-            align-items: center;
-            gap: 10px;
-            padding: 10px 0;
-            border-bottom: 1px solid rgba(255,255,255,0.1);
-            flex-wrap: wrap;
-        }
-        
-        .source-item:last-child { border-bottom: none; }
-        
-        .source-status {
-            width: 10px;
-            height: 10px;
-            border-radius: 50%;
-            flex-shrink: 0;
-        }
-        
-        .source-status.success { background: var(--success); }
-        .source-status.failed { background: var(--danger); }
-        
-        .source-link { color: var(--efteling-gold); text-decoration: none; word-break: break-all; }
-        .source-link:hover { text-decoration: underline; }
-        
-        .access-icons {
-            display: flex;
-            flex-wrap: wrap;
-            gap: 4px;
-            margin-top: 8px;
-            padding-top: 8px;
-            border-top: 1px solid rgba(0,0,0,0.1);
-        }
-        
-        .access-icon {
-            display: inline-flex;
-            align-items: center;
-            justify-content: center;
-            width: 24px;
-            height: 24px;
-            border-radius: 50%;
-            font-size: 12px;
-            cursor: help;
-        }
-        
-        .access-icon.warning { background: #fee2e2; color: #b91c1c; }
-        .access-icon.info { background: #dbeafe; color: #1e40af; }
-        .access-icon.good { background: #d1fae5; color: #065f46; }
-        .access-icon.neutral { background: #f3f4f6; color: #374151; }
-        
-        .wait-time {
-            display: inline-flex;
-            align-items: center;
-            gap: 4px;
-            padding: 4px 10px;
-            border-radius: 12px;
-            font-size: 0.85rem;
-            font-weight: 600;
-            margin-top: 6px;
-        }
-        .wait-time.open { background: #dcfce7; color: #166534; }
-        .wait-time.closed { background: #f3f4f6; color: #6b7280; }
-        .wait-time.busy { background: #fef3c7; color: #92400e; }
-        .wait-time.very-busy { background: #fee2e2; color: #991b1b; }
-        
-        .park-status {
-            text-align: center;
-            padding: 12px 20px;
-            border-radius: 12px;
-            margin-bottom: 20px;
-            font-weight: 600;
-        }
-        .park-status.open { background: #dcfce7; color: #166534; }
-        .park-status.closed { background: #f3f4f6; color: #6b7280; }
-        
-        .attribution {
-            text-align: center;
-            font-size: 0.8rem;
-            opacity: 0.7;
-            margin-top: 10px;
-        }
-        .attribution a { color: var(--efteling-gold); }
-        
-        footer {
-            text-align: center;
-            padding: 30px;
-            opacity: 0.7;
-            font-size: 0.85rem;
-        }
-        
-        @media (max-width: 768px) {
-            h1 { font-size: 1.8rem; }
-            .height-btn { padding: 10px 16px; font-size: 0.95rem; }
-            .attractions-grid { grid-template-columns: 1fr; }
-            th, td { padding: 8px; font-size: 0.8rem; }
-            .summary-number { font-size: 2rem; }
-        }
-    </style>
+    <link rel="preload" href="{{ asset_url('fonts/quicksand-latin-wght-normal.woff2') }}" as="font" type="font/woff2" crossorigin>
+    <link rel="stylesheet" href="{{ asset_url('app.css') }}">
 </head>
 <body>
     <div class="container">
@@ -409,9 +122,20 @@ HTML_TEMPLATE = """
             </div>
         </header>
         
+        {% for upstream in stale_upstreams %}
+        <div class="stale-banner">
+            ⚠️ {{ upstream.host }} is not reachable since {{ upstream.since }}: showing the data
+            {%- if upstream.last_success %} last fetched {{ upstream.last_success }}{% else %} from before the outage{% endif %}
+        </div>
+        {% endfor %}
+        
+"""
+
+# Full mode: every height pre-rendered server-side, showHeight() only toggles visibility
+FULL_RESULTS = """\
         <div class="height-selector">
             {% for height in [95, 100, 110, 120, 130, 135] %}
-            <button class="height-btn {% if height == 120 %}active{% endif %}" onclick="showHeight({{ height }})">{{ height }} cm</button>
+            <button class="height-btn {% if height == 120 %}active{% endif %}" data-height="{{ height }}">{{ height }} cm</button>
             {% endfor %}
         </div>
         
@@ -506,7 +230,7 @@ HTML_TEMPLATE = """
             {% if categories.with_companion %}
             <div class="category companion">
                 <h2><span class="category-icon">👨‍👧</span> With Supervision/Companion ({{ categories.with_companion|length }})</h2>
-                <p style="margin-bottom: 15px; opacity: 0.9; font-size: 0.9rem;">
+                <p class="category-intro">
                     {% if categories.with_companion[0].companion_age %}
                     Children this height need an accompanying person aged {{ categories.with_companion[0].companion_age }}+
                     {% else %}
@@ -613,10 +337,13 @@ HTML_TEMPLATE = """
         </div>
         {% endfor %}
         
+"""
+
+PAGE_SHOWS = """\
         {% if shows %}
         <div class="shows-section">
             <h2>🎭 Shows (No Height Requirements)</h2>
-            <p style="text-align: center; margin-bottom: 15px; opacity: 0.8;">Shows are separate from attractions - everyone can enjoy!</p>
+            <p class="section-note">Shows are separate from attractions - everyone can enjoy!</p>
             <div class="attractions-grid">
                 {% for show in shows %}
                 <a href="{{ show.url }}" target="_blank" rel="noopener" class="attraction-card show-card">
@@ -632,8 +359,11 @@ HTML_TEMPLATE = """
         </div>
         {% endif %}
         
+"""
+
+FULL_TABLE = """\
         <h2 class="section-title">📋 Complete Requirements Table</h2>
-        <p style="text-align: center; margin-bottom: 15px; opacity: 0.9; font-size: 0.9rem;">
+        <p class="section-note small">
             💡 "Ride Alone" = minimum height to ride independently | "Companion Needed" = children below this height need adult supervision
         </p>
         <table>
@@ -648,8 +378,8 @@ HTML_TEMPLATE = """
             </thead>
             <tbody>
                 {% for attr in attractions %}
-                <tr class="clickable-row" onclick="window.open('{{ attr.url }}', '_blank')">
-                    <td><a href="{{ attr.url }}" target="_blank" class="external-link" onclick="event.stopPropagation()">{{ attr.name }} ↗</a></td>
+                <tr class="clickable-row" data-url="{{ attr.url }}">
+                    <td><a href="{{ attr.url }}" target="_blank" class="external-link">{{ attr.name }} ↗</a></td>
                     <td>{{ attr.type }}</td>
                     <td>
                         {% if attr.min_height_cm %}
@@ -675,9 +405,12 @@ HTML_TEMPLATE = """
             </tbody>
         </table>
         
-        <div class="sources-section" style="margin-top: 30px;">
+"""
+
+PAGE_FOOTER = """\
+        <div class="sources-section legend-section">
             <h2>🔑 Access Icon Legend</h2>
-            <div style="display: grid; grid-template-columns: repeat(auto-fill, minmax(200px, 1fr)); gap: 10px; margin-top: 15px;">
+            <div class="legend-grid">
                 <div><span class="access-icon good">♿</span> Wheelchair accessible</div>
                 <div><span class="access-icon info">🔄</span> Wheelchair with transfer</div>
                 <div><span class="access-icon warning">🚫</span> Not wheelchair accessible</div>
@@ -704,16 +437,16 @@ HTML_TEMPLATE = """
                 <strong>{{ source.name }}</strong>
                 <a href="{{ source.url }}" target="_blank" class="source-link">{{ source.url }}</a>
                 {% if source.attractions_scraped is defined %}
-                <span style="opacity: 0.7; font-size: 0.85rem; margin-left: auto;">({{ source.attractions_scraped }} scraped)</span>
+                <span class="source-meta">({{ source.attractions_scraped }} scraped)</span>
                 {% endif %}
             </div>
             {% endfor %}
             {% if wait_times_info and wait_times_info.source %}
             <div class="source-item">
-                <span class="source-status success"></span>
+                <span class="source-status {{ 'stale' if wait_times_stale else 'success' }}"></span>
                 <strong>Wait Times</strong>
                 <a href="{{ wait_times_info.source }}" target="_blank" class="source-link">{{ wait_times_info.source }}</a>
-                <span style="opacity: 0.7; font-size: 0.85rem; margin-left: auto;">(updates every 5 min)</span>
+                <span class="source-meta">(updates every 5 min)</span>
             </div>
             {% endif %}
         </div>
@@ -727,63 +460,336 @@ HTML_TEMPLATE = """
         </footer>
     </div>
     
-    <script>
-        function showHeight(height) {
-            document.querySelectorAll('.results').forEach(el => el.classList.remove('active'));
-            document.querySelectorAll('.height-btn').forEach(btn => btn.classList.remove('active'));
-            document.getElementById('results-' + height).classList.add('active');
-            event.target.classList.add('active');
-        }
-    </script>
+"""
+
+FULL_SCRIPT = """\
+    <script src="{{ asset_url('full.js') }}" defer></script>
+</body>
+</html>
+"""
+
+HTML_TEMPLATE = PAGE_HEAD + FULL_RESULTS + PAGE_SHOWS + FULL_TABLE + PAGE_FOOTER + FULL_SCRIPT
+
+# Lean mode: the attraction list is embedded once as compact JSON and the
+# browser categorizes it for any height with the same thresholds as rules.py
+LEAN_RESULTS = """\
+        <div class="height-selector">
+            {% for height in [95, 100, 110, 120, 130, 135] %}
+            <button class="height-btn" data-height="{{ height }}">{{ height }} cm</button>
+            {% endfor %}
+            <input class="height-input" type="number" min="{{ min_height }}" max="{{ max_height }}" value="120" aria-label="Height in cm">
+        </div>
+        
+        <p class="hint">💡 Click any attraction card to view official details on Efteling.com</p>
+        
+        <div id="results"></div>
+        
+"""
+
+LEAN_TABLE = """\
+        <h2 class="section-title">📋 Complete Requirements Table</h2>
+        <p class="section-note small">
+            💡 "Ride Alone" = minimum height to ride independently | "Companion Needed" = children below this height need adult supervision
+        </p>
+        <table>
+            <thead>
+                <tr>
+                    <th>Attraction</th>
+                    <th>Type</th>
+                    <th>Ride Alone</th>
+                    <th>Companion Needed</th>
+                    <th>Age</th>
+                </tr>
+            </thead>
+            <tbody id="requirements-body"></tbody>
+        </table>
+        
+"""
+
+LEAN_SCRIPT = """\
+    <script id="attractions-data" type="application/json">{{ lean_payload|safe }}</script>
+    <script src="{{ asset_url('lean.js') }}" defer></script>
 </body>
 </html>
 """
 
-def load_data():
-    """Load attraction data from JSON file"""
-    if DATA_FILE.exists():
-        with open(DATA_FILE) as f:
-            return json.load(f)
-    return None
+LEAN_TEMPLATE = PAGE_HEAD + LEAN_RESULTS + PAGE_SHOWS + LEAN_TABLE + PAGE_FOOTER + LEAN_SCRIPT
+
+# Snapshot of the current data generation, shared by all routes of this worker.
+# Loaded in the gunicorn master before fork (see gunicorn.conf.py) so workers
+# start out sharing it copy-on-write. Generations published later are mapped
+# (_published) and their Snapshot is only built once a route needs it.
+_snapshot = None
+_snapshot_key = None
+_outdated_key = None
+_published = None
+
+# With a shared cache: the pid subscribed to snapshot announcements (the listener thread
+# does not survive the fork), whether one arrived, and when the generation was last checked
+SHARED_CHECK_INTERVAL = 30
+_shared_pid = None
+_shared_pending = False
+_shared_checked = 0.0
+
+def _on_shared_snapshot(message):
+    global _shared_pending
+    _shared_pending = True
+
+def shared_snapshot(shared):
+    """
+    The leader's shared snapshot, loaded when a new generation is announced. The generation is
+    also re-checked every SHARED_CHECK_INTERVAL seconds, in case an announcement was missed.
+    None until the leader shared one (or while the shared cache is unreachable).
+    """
+    global _shared_pid, _shared_pending, _shared_checked
+    if _shared_pid != os.getpid():
+        # Only tried once per process: if it fails, the periodic check still picks up new generations
+        _shared_pid, _shared_pending = os.getpid(), True
+        shared.subscribe(SNAPSHOT_CHANNEL, _on_shared_snapshot)
+    if _shared_pending or time.monotonic() - _shared_checked > SHARED_CHECK_INTERVAL:
+        _shared_pending, _shared_checked = False, time.monotonic()
+        generation = shared_generation(shared)
+        if generation is not None and ('shared', generation) != _snapshot_key:
+            snapshot = load_shared_snapshot(shared)
+            if snapshot is not None:
+                _set_snapshot(snapshot, ('shared', generation))
+    return _snapshot if _snapshot_key and _snapshot_key[0] == 'shared' else None
+
+def refresh_snapshot():
+    """Switch to the newest generation: shared by the leader, published on the volume, or in storage"""
+    global _outdated_key
+    try:
+        shared = get_shared()
+        if shared is not None and shared_snapshot(shared) is not None:
+            return
+    except Exception as e:  # unreachable, or misconfigured (unknown scheme, no redis package)
+        app.logger.warning(f"Shared cache unavailable, serving the local snapshot: {e}")
+    key = published_snapshot_key()
+    if key is not None and key not in (_snapshot_key, _outdated_key):
+        try:
+            _set_snapshot(None, key, PublishedSnapshot())
+        except (OSError, ValueError) as e:
+            # e.g. published by another model version; build from storage until the next publish
+            app.logger.warning(f"Not using the published snapshot: {e}")
+            _outdated_key = key
+    if key is None or key == _outdated_key:
+        # Nothing (usable) published yet: build from storage
+        storage = get_storage()
+        key = storage.generation()
+        if key is not None and key != _snapshot_key:
+            data = storage.load_data()
+            if data is not None:
+                _set_snapshot(Snapshot.from_dict(data, storage.change_generation()), key)
+
+def get_snapshot():
+    """Return the current snapshot, reloading it only when a new generation was published"""
+    global _snapshot
+    refresh_snapshot()
+    if _snapshot is None and _published is not None:
+        _snapshot = _published.snapshot
+    return _snapshot
+
+def published_snapshot():
+    """The mapped PublishedSnapshot of the current generation, None if it came from elsewhere"""
+    refresh_snapshot()
+    return _published
+
+def _set_snapshot(snapshot, key, published=None):
+    global _snapshot, _snapshot_key, _published
+    _snapshot, _snapshot_key, _published = snapshot, key, published
+    # Keys carry the snapshot key, so nothing cached before can be hit again
+    response_cache.clear()
+
+# (snapshot key, route, *normalized args) -> PreparedBody
+response_cache = ResponseCache()
+
+def prepared_body(key, build, levels=WORKER_LEVELS):
+    """Build the body bytes once per data generation and key (route, args...) and keep them plus compressed variants"""
+    return response_cache.get_or_build((_snapshot_key,) + key, lambda: PreparedBody.build(build(), levels))
+
+def prepared_json(key, build, levels=WORKER_LEVELS):
+    """prepared_body() for a JSON payload"""
+    return prepared_body(key, lambda: get_codec('json').encode(build()), levels)
+
+def prepared_response(body, status=200, mimetype='application/json'):
+    """Serve a PreparedBody in the best precompressed encoding the client accepts"""
+    encoding = negotiate(request.accept_encodings, body.encoded)
+    # bytes(): a published body is a view into the mapped snapshot file
+    if encoding:
+        response = Response(bytes(body.encoded[encoding]), status=status, mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = Response(bytes(body.raw), status=status, mimetype=mimetype)
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.after_request
+def compress_response(response):
+    """Compress dynamic responses on the fly; prepared bodies arrive already encoded"""
+    if (response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or not is_compressible(response.mimetype)):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.accept_encodings)
+    if encoding and response.content_length and response.content_length >= MIN_SIZE:
+        response.set_data(compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+# "full" renders every height server-side, "lean" embeds the data once (override with ?view=)
+PAGE_MODE = os.environ.get('PAGE_MODE', 'full')
+
+# (condition, value, css class, title, icon) in legend order
+ACCESS_ICONS = [
+    ("wheelchair", "accessible", "good", "Wheelchair accessible", "♿"),
+    ("wheelchair", "transfer", "info", "Wheelchair with transfer", "🔄"),
+    ("wheelchair", "not_accessible", "warning", "Not wheelchair accessible", "🚫"),
+    ("pregnant", True, "warning", "Not suitable for pregnant women", "🤰"),
+    ("injuries", True, "warning", "Not suitable with injuries", "🩹"),
+    ("cameras", True, "warning", "Cameras not allowed", "📵"),
+    ("guide_dogs", True, "good", "Guide dogs allowed", "🦮"),
+    ("single_rider", True, "info", "Single rider available", "👤"),
+    ("dark", True, "neutral", "Partly in the dark", "🌙"),
+    ("loud", True, "neutral", "Loud noises", "🔊"),
+    ("wet", True, "info", "You may get wet", "💦"),
+    ("dizzy", True, "neutral", "May cause dizziness", "😵"),
+    ("fog", True, "neutral", "Smoke/fog effects", "🌫️"),
+    ("fire", True, "neutral", "Fire effects", "🔥"),
+    ("surprising", True, "neutral", "Surprising effects", "⚡"),
+]
+
+LEAN_FIELDS = [
+    "name", "type", "type_label", "url", "min", "sup", "companion_age",
+    "advisory_age", "notes", "access", "is_open", "wait_time",
+]
+
+def lean_payload(snapshot):
+    """Attraction list as compact row arrays, safe to embed in a <script> element"""
+    payload = {
+        "fields": LEAN_FIELDS,
+        "rows": [
+            [a.name, a.type, a.type_dutch or a.type, a.url, a.min_height_cm, a.supervision_height_cm,
+             a.companion_age, a.advisory_age, a.notes, a.access_mask, a.is_open, a.wait_time]
+            for a in snapshot.attractions
+        ],
+        "icons": [[ACCESS_BITS[(key, value)], css, title, icon] for key, value, css, title, icon in ACCESS_ICONS],
+        "ranges": snapshot.height_ranges.to_dict(),
+        "park_open": (snapshot.wait_times_info or {}).get("park_open"),
+        "default_height": 120,
+    }
+    encoded = get_codec('json').encode(payload).decode()
+    return encoded.replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026')
+
+def _format_moment(value):
+    """ISO timestamp (UTC from the breakers) -> local 'Oct 18, 14:05'"""
+    return parse_timestamp(value).astimezone().strftime('%b %d, %H:%M') if value else None
+
+def _page_context(snapshot):
+    """Template variables shared by the full and lean pages"""
+    try:
+        dt = datetime.fromisoformat(snapshot.last_updated)
+        last_updated = dt.strftime('%b %d, %Y %H:%M')
+    except:
+        last_updated = 'Unknown'
+    
+    # Hosts behind an open circuit breaker: their data is the last good one, shown as stale
+    stale = snapshot.upstreams
+    wait_times_source = (snapshot.wait_times_info or {}).get('source')
+    return dict(
+        attractions=snapshot.attractions,
+        min_height=HEIGHT_RANGE.start,
+        max_height=HEIGHT_RANGE.stop - 1,
+        shows=snapshot.shows,
+        height_categories=snapshot.height_categories,
+        sources=[
+            dict(source, status='stale') if urlsplit(source.get('url') or '').hostname in stale else source
+            for source in snapshot.sources
+        ],
+        stale_upstreams=[
+            {'host': host, 'since': _format_moment(upstream['opened_at']),
+             'last_success': _format_moment(upstream['last_success'])}
+            for host, upstream in stale.items()
+        ],
+        wait_times_stale=bool(wait_times_source) and urlsplit(wait_times_source).hostname in stale,
+        last_updated=last_updated,
+        total_attractions=snapshot.total_attractions,
+        total_shows=snapshot.total_shows,
+        wait_times_info=snapshot.wait_times_info or {}
+    )
 
 @app.route('/')
 def index():
     """Main page"""
-    data = load_data()
+    snapshot = get_snapshot()
     
-    if data is None:
-        return """
-        <html><head><title>Efteling Height Requirements</title></head>
-        <body style="font-family: sans-serif; text-align: center; padding: 50px; background: #0d2818; color: white;">
+    if snapshot is None:
+        return f"""
+        <html><head><title>Efteling Height Requirements</title><link rel="stylesheet" href="{asset_url('app.css')}"></head>
+        <body class="loading-page">
             <h1>⏳ Data Loading...</h1>
             <p>The scraper is collecting data. Please refresh in a few minutes.</p>
-            <p><a href="/api/scrape" style="color: #c9a227;">Trigger manual scrape</a></p>
+            <p><a href="/api/scrape">Trigger manual scrape</a></p>
         </body></html>
         """
     
-    try:
-        dt = datetime.fromisoformat(data['last_updated'])
-        last_updated = dt.strftime('%b %d, %Y %H:%M')
-    except:
-        last_updated = 'Unknown'
+    if request.args.get('view', PAGE_MODE) == 'lean':
+        # Rendered once per data generation, all height switching happens in the browser
+        body = prepared_body(('page', 'lean'), lambda: render_template_string(
+            LEAN_TEMPLATE, lean_payload=lean_payload(snapshot), **_page_context(snapshot)
+        ).encode())
+        return prepared_response(body, mimetype='text/html')
     
-    return render_template_string(
-        HTML_TEMPLATE,
-        attractions=data.get('attractions', []),
-        shows=data.get('shows', []),
-        height_categories=data.get('height_categories', {}),
-        sources=data.get('sources', []),
-        last_updated=last_updated,
-        total_attractions=data.get('total_attractions', 0),
-        total_shows=data.get('total_shows', 0),
-        wait_times_info=data.get('wait_times_info', {})
-    )
+    body = prepared_body(('page', 'full'), lambda: render_template_string(
+        HTML_TEMPLATE, **_page_context(snapshot)
+    ).encode())
+    return prepared_response(body, mimetype='text/html')
 
 @app.route('/api/data')
 def api_data():
     """JSON API endpoint"""
-    data = load_data()
-    return jsonify(data) if data else (jsonify({'error': 'No data'}), 404)
+    published = published_snapshot()
+    if published is not None:
+        # Served from the mapped file without decoding any section
+        response = prepared_response(published.body('data'))
+        response.headers['X-Data-Generation'] = str(published.generation)
+        return response
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return jsonify({'error': 'No data'}), 404
+    response = prepared_response(prepared_json(('data',), snapshot.to_dict))
+    response.headers['X-Data-Generation'] = str(snapshot.generation)
+    return response
+
+@app.route('/api/changes')
+def api_changes():
+    """Fields changed since ?since=<generation>, or the full document if that is too old"""
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return jsonify({'error': 'No data'}), 404
+    
+    since = request.args.get('since', '0')
+    if not since.isdigit():
+        return jsonify({'error': f"Invalid since '{since}', expected a generation number"}), 400
+    since = int(since)
+    generation = snapshot.generation if isinstance(snapshot.generation, int) else None
+    
+    key = (_snapshot_key, 'changes', since)
+    body = response_cache.get(key)
+    if body is None:
+        # Only the snapshot's own generation is served, even if the log already has newer entries
+        change_sets = get_storage().changes_since(since, generation) if generation is not None else None
+        if change_sets is None:
+            # Every outdated client shares one full body
+            body = response_cache.put(key, prepared_json(('changes', 'full'), lambda: {
+                'generation': generation or 0, 'full': True, 'data': snapshot.to_dict(),
+            }), alias=True)
+        else:
+            body = response_cache.put(key, PreparedBody.build(get_codec('json').encode({
+                'generation': generation, 'full': False, **merge_changes(change_sets),
+            })))
+    return prepared_response(body)
 
 @app.route('/api/scrape')
 def api_scrape():
@@ -795,6 +801,91 @@ def api_scrape():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# /api/scrape/stats: runs summarized by default, and how much slower than its
+# median over those runs a page fetch must be to count as a regression
+SCRAPE_STATS_RUNS = 10
+SLOW_PAGE_FACTOR = 2
+SLOW_PAGE_MIN_MS = 250
+
+def _percentiles(values):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    return {'p50': values[len(values) // 2], 'p95': values[min(len(values) - 1, len(values) * 95 // 100)], 'max': values[-1]}
+
+def summarize_scrape_run(run):
+    """Totals and latency percentiles of one scrape run"""
+    pages = run['pages']
+    statuses = {}
+    for page in pages:
+        statuses[page['status']] = statuses.get(page['status'], 0) + 1
+    return {
+        'started_at': run['started_at'],
+        'duration_ms': run['duration_ms'],
+        'pages': len(pages),
+        'statuses': statuses,
+        'bytes': sum(page['bytes'] or 0 for page in pages),
+        'fetch_ms': _percentiles(page['fetch_ms'] for page in pages),
+        'parse_ms': _percentiles(page['parse_ms'] for page in pages),
+        'fallback_pages': sum(1 for page in pages if page['fallback_fields']),
+    }
+
+def scrape_regressions(latest, previous_runs):
+    """Pages of the latest run that failed, lost parse rules or got slower compared with the runs before"""
+    if not previous_runs:
+        return []
+    before = {page['name']: page for page in previous_runs[0]['pages']}
+    fetch_times = {}
+    for run in previous_runs:
+        for page in run['pages']:
+            if page['fetch_ms'] is not None:
+                fetch_times.setdefault(page['name'], []).append(page['fetch_ms'])
+
+    regressions = []
+    for page in latest['pages']:
+        name, previous = page['name'], before.get(page['name'])
+        if previous and previous['status'] == 'success' and page['status'] != 'success':
+            regressions.append({'name': name, 'kind': 'status', 'previous': previous['status'],
+                                'current': page['status'], 'error': page['error']})
+        elif previous and page['status'] == 'success' and set(previous['rules']) - set(page['rules']):
+            regressions.append({'name': name, 'kind': 'rules', 'lost': sorted(set(previous['rules']) - set(page['rules']))})
+        if page['fetch_ms'] is not None and name in fetch_times:
+            typical = median(fetch_times[name])
+            if page['fetch_ms'] > max(SLOW_PAGE_FACTOR * typical, typical + SLOW_PAGE_MIN_MS):
+                regressions.append({'name': name, 'kind': 'slower', 'previous': typical, 'current': page['fetch_ms']})
+    return regressions
+
+@app.route('/api/scrape/stats')
+def api_scrape_stats():
+    """Per-page diagnostics of the last scrape runs, to spot slow pages and regressions"""
+    try:
+        runs = int(request.args.get('runs', SCRAPE_STATS_RUNS))
+        if runs < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': f"Invalid runs '{request.args.get('runs')}', expected a positive number"}), 400
+    history = get_storage().load_scrape_runs(min(runs, SCRAPE_RUN_LIMIT))
+    if not history:
+        return jsonify({'error': 'No scrape runs recorded yet'}), 404
+
+    latest = history[0]
+    return jsonify({
+        'runs': [summarize_scrape_run(run) for run in history],
+        'latest': latest,
+        'slowest': sorted(latest['pages'], key=lambda p: (p['fetch_ms'] or 0) + (p['parse_ms'] or 0), reverse=True)[:5],
+        'regressions': scrape_regressions(latest, history[1:]),
+    })
+
+@app.route('/api/cache/stats')
+def api_cache_stats():
+    """Response cache size and hit rates of this worker"""
+    snapshot = get_snapshot()
+    return jsonify(dict(
+        response_cache.metrics(),
+        pid=os.getpid(),
+        generation=snapshot.generation if snapshot and isinstance(snapshot.generation, int) else None,
+    ))
+
 @app.route('/api/wait_times')
 def api_wait_times():
     """Trigger manual refresh of wait times"""
@@ -805,13 +896,200 @@ def api_wait_times():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# Heights every endpoint and the lean page accept: the range the stored height_ranges cover
+HEIGHT_RANGE = range(MIN_HEIGHT, MAX_HEIGHT + 1)
+
+def _height_error(height):
+    return f"Invalid height {height!r}, expected centimeters between {HEIGHT_RANGE.start} and {HEIGHT_RANGE.stop - 1}"
+
 @app.route('/api/height/<int:height>')
 def api_height(height):
-    """Get attractions for specific height"""
-    data = load_data()
-    if data and str(height) in data.get('height_categories', {}):
-        return jsonify(data['height_categories'][str(height)])
-    return jsonify({'error': 'Invalid height'}), 404
+    """Get attractions for any height in the precomputed ranges"""
+    if height not in HEIGHT_RANGE:
+        return jsonify({'error': _height_error(height)}), 404
+    published = published_snapshot()
+    if published is not None:
+        # Only the small height_ranges section is decoded, never attractions or sources
+        index = published.height_range(height)
+        if index is None:
+            return jsonify({'error': _height_error(height)}), 404
+        return prepared_response(published.body(f'height-range/{index}'))
+    snapshot = get_snapshot()
+    index = snapshot.height_ranges.index(height) if snapshot else None
+    if index is None:
+        return jsonify({'error': _height_error(height)}), 404
+    # Every height of a range has the same body, so it is prepared once per range
+    categories = snapshot.height_ranges.categories[index]
+    return prepared_response(prepared_json(('height-range', index), lambda: categories.to_dict(snapshot.has_wait_times)))
+
+def _parse_list(value):
+    """Split a comma separated query parameter into names"""
+    return [v.strip() for v in (value or '').split(',') if v.strip()]
+
+def _parse_flags(value):
+    """Comma separated access conditions -> bitmask"""
+    mask = 0
+    for name in _parse_list(value):
+        if name not in ACCESS_FLAGS:
+            raise ValueError(f"Unknown access condition '{name}', expected one of: {', '.join(ACCESS_FLAGS)}")
+        mask |= ACCESS_FLAGS[name]
+    return mask
+
+def query_attractions(snapshot, height, require_mask, exclude_mask, wheelchair):
+    """Filtered attraction list for one snapshot"""
+    attractions = []
+    for attr, category in snapshot.query(height, require_mask, exclude_mask, wheelchair):
+        item = attr.to_dict(snapshot.has_wait_times)
+        if category is not None:
+            item['height_category'] = category
+        attractions.append(item)
+    return {'count': len(attractions), 'attractions': attractions}
+
+@app.route('/api/attractions')
+def api_attractions():
+    """Filtered attractions, e.g. ?height=115&wheelchair=accessible,transfer&exclude=dark,loud&require=guide_dogs"""
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return jsonify({'error': 'No data'}), 404
+    
+    try:
+        height = request.args.get('height')
+        if height and not (height.isdigit() and int(height) in HEIGHT_RANGE):
+            raise ValueError(_height_error(height))
+        height = int(height) if height else None
+        wheelchair = _parse_list(request.args.get('wheelchair'))
+        unknown = set(wheelchair) - set(WHEELCHAIR_VALUES)
+        if unknown:
+            raise ValueError(f"Unknown wheelchair value '{sorted(unknown)[0]}', expected one of: {', '.join(WHEELCHAIR_VALUES)}")
+        require_mask = _parse_flags(request.args.get('require'))
+        exclude_mask = _parse_flags(request.args.get('exclude'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Normalized key: every height of an index segment gives the same answer, flag order doesn't matter
+    wheelchair = wheelchair_mask(wheelchair)
+    segment = snapshot.access_index.segment(height) if height is not None else None
+    body = prepared_json(
+        ('attractions', segment, require_mask, exclude_mask, wheelchair),
+        lambda: query_attractions(snapshot, height, require_mask, exclude_mask, wheelchair),
+        DYNAMIC_LEVELS,
+    )
+    return prepared_response(body)
+
+# Batch height queries: enough for any family, small enough to bound the work
+MAX_FAMILY_HEIGHTS = 12
+
+def family_heights(snapshot, heights):
+    """Per-child categories and the shared ride list"""
+    result = snapshot.family(heights)
+    with_wait_times = snapshot.has_wait_times
+    children = [
+        dict({'height_cm': height}, **{
+            category: [a.name for a in getattr(categories, category)] for category in CATEGORIES
+        })
+        for height, categories in result['children']
+    ]
+    together = [
+        dict(attr.to_dict(with_wait_times), companion_needed_for=needs_companion)
+        for attr, needs_companion in result['together']
+    ]
+    return {'heights': list(heights), 'children': children, 'together': together, 'together_count': len(together)}
+
+@app.route('/api/heights', methods=['POST'])
+def api_heights():
+    """Several children at once, body {"heights": [98, 112, 131]}"""
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return jsonify({'error': 'No data'}), 404
+    
+    payload = request.get_json(silent=True)
+    heights = payload.get('heights') if isinstance(payload, dict) else None
+    if not isinstance(heights, list) or not heights:
+        return jsonify({'error': 'Expected a JSON body like {"heights": [98, 112, 131]}'}), 400
+    if len(heights) > MAX_FAMILY_HEIGHTS:
+        return jsonify({'error': f'At most {MAX_FAMILY_HEIGHTS} heights per request'}), 400
+    for height in heights:
+        if not isinstance(height, int) or isinstance(height, bool) or height not in HEIGHT_RANGE:
+            return jsonify({'error': _height_error(height)}), 400
+    
+    heights = tuple(heights)
+    return prepared_response(prepared_json(('heights', heights), lambda: family_heights(snapshot, heights), DYNAMIC_LEVELS))
+
+# Fields selectable with ?fields= on the NDJSON exports
+ATTRACTION_EXPORT_FIELDS = tuple(f for f in Attraction.__slots__ if f != 'access_mask') + ('access',)
+HISTORY_EXPORT_FIELDS = ('ride', 'fetched_at', 'is_open', 'wait_time')
+
+def _parse_fields(value, allowed):
+    """?fields=name,wait_time -> tuple of field names (empty: all)"""
+    fields = tuple(_parse_list(value))
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field '{unknown[0]}', expected any of: {', '.join(allowed)}")
+    return fields
+
+def _parse_since(value):
+    """?since=<ISO 8601 timestamp> -> aware datetime or None"""
+    if not value:
+        return None
+    try:
+        return parse_timestamp(value)
+    except ValueError:
+        raise ValueError(f"Invalid since '{value}', expected an ISO 8601 timestamp") from None
+
+def ndjson_response(records):
+    """Stream dicts as one JSON document per line, compressed incrementally when accepted"""
+    codec = get_codec('json')
+    lines = (codec.encode(record) + b'\n' for record in records)
+    encoding = negotiate(request.accept_encodings)
+    response = Response(
+        stream_with_context(compress_stream(lines, encoding) if encoding else lines),
+        mimetype='application/x-ndjson',
+    )
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/api/export/attractions')
+def api_export_attractions():
+    """NDJSON, one attraction per line, e.g. ?fields=name,wait_time&since=2026-07-01T12:00:00Z"""
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return jsonify({'error': 'No data'}), 404
+    
+    try:
+        fields = _parse_fields(request.args.get('fields'), ATTRACTION_EXPORT_FIELDS)
+        since = _parse_since(request.args.get('since'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # A scrape after since changed everything; otherwise only attractions with newer wait data
+    rescraped = since is None or (snapshot.last_updated and parse_timestamp(snapshot.last_updated) > since)
+    
+    def records():
+        for attr in snapshot.attractions:
+            if not rescraped and not (attr.wait_last_updated and parse_timestamp(attr.wait_last_updated) > since):
+                continue
+            if fields:
+                yield {f: getattr(attr, f) for f in fields}
+            else:
+                yield attr.to_dict(snapshot.has_wait_times)
+    
+    return ndjson_response(records())
+
+@app.route('/api/export/history')
+def api_export_history():
+    """NDJSON, one wait time sample per line, e.g. ?since=2026-07-01T12:00:00Z&fields=ride,wait_time"""
+    try:
+        fields = _parse_fields(request.args.get('fields'), HISTORY_EXPORT_FIELDS)
+        since = _parse_since(request.args.get('since'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    samples = get_storage().iter_wait_history(since)
+    if fields:
+        samples = ({f: sample[f] for f in fields} for sample in samples)
+    return ndjson_response(samples)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
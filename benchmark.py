@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+Efteling Height Checker Benchmarks
+Micro-benchmarks for the data path, run with: python benchmark.py [section ...]
+"""
+
+import argparse
+import gc
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+
+def sample_data(scale: int = 1) -> dict:
+    """
+    Attractions document built offline from the scraper's embedded data.
+    With scale > 1 every attraction is repeated under a new name to simulate larger parks.
+    """
+    from scraper import (
+        ATTRACTION_SLUGS, EFTELING_BASE_URL, apply_fallback_data, get_shows,
+    )
+    from rules import height_ranges
+
+    attractions = []
+    for i in range(scale):
+        for slug, info in ATTRACTION_SLUGS.items():
+            attractions.append({
+                "name": info["name"] if i == 0 else f"{info['name']} #{i}",
+                "name_dutch": info["name_dutch"],
+                "type": info["type"],
+                "type_dutch": info["type_dutch"],
+                "min_height_cm": None,
+                "supervision_height_cm": None,
+                "companion_age": None,
+                "advisory_age": None,
+                "notes": "",
+                "access": {},
+                "url": f"{EFTELING_BASE_URL}/{slug}",
+                "slug": slug if i == 0 else f"{slug}-{i}",
+                "category": "attraction",
+                "scrape_status": "failed",
+            })
+    attractions = apply_fallback_data(attractions)
+    for attr in attractions:
+        # apply_fallback_data shares the fallback access dicts; a parsed file would not
+        attr["access"] = dict(attr["access"])
+    shows = get_shows()
+
+    return {
+        "last_updated": "2026-01-01T00:00:00",
+        "total_attractions": len(attractions),
+        "total_shows": len(shows),
+        "scrape_stats": {"successful": 0, "failed": len(attractions)},
+        "attractions": attractions,
+        "shows": shows,
+        "height_ranges": height_ranges(attractions),
+        "sources": [],
+    }
+
+
+def legacy_sample_data(scale: int = 1) -> dict:
+    """sample_data() as written before height_ranges: height_categories repeats every attraction dict"""
+    from rules import categorize_heights
+
+    data = sample_data(scale)
+    del data["height_ranges"]
+    data["height_categories"] = categorize_heights(data["attractions"])
+    return data
+
+
+def timeit(func, repeat: int = 200) -> float:
+    """Best-of average time per call in microseconds"""
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best * 1e6
+
+
+def _rss_kb() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _trim_heap() -> None:
+    """Hand freed heap pages back to the OS (glibc only) so RSS reflects retained memory"""
+    try:
+        import ctypes
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+# Per-worker representations compared by bench_memory: the parsed document with the
+# duplicated height_categories, the parsed document with height_ranges, the Snapshot
+MEMORY_KINDS = ("legacy", "dict", "snapshot")
+
+
+def _document(kind: str, scale: int) -> str:
+    return json.dumps(legacy_sample_data(scale) if kind == "legacy" else sample_data(scale))
+
+
+def _build(kind: str, encoded: str):
+    """Build the per-worker representation the way app.py would hold it"""
+    data = json.loads(encoded)
+    if kind in ("legacy", "dict"):
+        return data
+    from model import Snapshot
+    return Snapshot.from_dict(data)
+
+
+def _rss_child(kind: str, scale: int) -> None:
+    """Entry point for the RSS subprocess: print resident memory growth of one worker copy"""
+    encoded = _document(kind, scale)
+    import model  # noqa: F401  -- keep import cost out of the measurement
+    gc.collect()
+    _trim_heap()
+    before = _rss_kb()
+    held = _build(kind, encoded)
+    gc.collect()
+    _trim_heap()
+    print(_rss_kb() - before)
+    del held
+
+
+def bench_memory(scale: int) -> None:
+    """Per-worker memory of the parsed dict documents (legacy and with height_ranges) vs. the slots Snapshot"""
+    from model import Snapshot  # noqa: F401  -- keep import cost out of the measurement
+
+    print(f"memory (scale={scale}, {len(sample_data(scale)['attractions'])} attractions)")
+
+    for kind in MEMORY_KINDS:
+        encoded = _document(kind, scale)
+        gc.collect()
+        tracemalloc.start()
+        held = _build(kind, encoded)
+        gc.collect()
+        traced, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del held
+
+        rss = subprocess.run(
+            [sys.executable, __file__, "--rss-child", kind, "--scale", str(scale)],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        # RSS includes heap fragmentation left behind by the transient json.loads
+        print(f"  {kind:<9} tracemalloc {traced / 1024:8.1f} KiB   RSS +{rss} KiB")
+
+
+def bench_query(scale: int) -> None:
+    """Accessibility filter: dict walk over attractions vs. the bitset AccessIndex"""
+    from model import ACCESS_FLAGS, Snapshot, wheelchair_mask
+    from rules import category_for_height
+
+    data = sample_data(scale)
+    snapshot = Snapshot.from_dict(data)
+    excluded = ("dark", "loud")
+
+    def dict_filter():
+        return [
+            a for a in data["attractions"]
+            if category_for_height(a["min_height_cm"], a["supervision_height_cm"], 115) != "not_available"
+            and a["access"].get("wheelchair") == "accessible"
+            and not any(a["access"].get(flag) for flag in excluded)
+        ]
+
+    exclude_mask = ACCESS_FLAGS["dark"] | ACCESS_FLAGS["loud"]
+    wheelchair = wheelchair_mask(["accessible"])
+
+    def bitset_filter():
+        return snapshot.access_index.select(115, 0, exclude_mask, wheelchair)
+
+    assert len(dict_filter()) == bin(bitset_filter()).count("1")
+    print(f"query (scale={scale}, height=115&wheelchair=accessible&exclude=dark,loud)")
+    print(f"  dict walk   {timeit(dict_filter):8.2f} us")
+    print(f"  bitset      {timeit(bitset_filter):8.2f} us")
+
+    family = (98, 112, 131)
+
+    def family_walks():
+        per_child = [_legacy_categorize_by_height(data["attractions"], h) for h in family]
+        blocked = {a["name"] for c in per_child for a in c["not_available"]}
+        companion = [{a["name"] for a in c["with_companion"]} for c in per_child]
+        together = [
+            (a, [h for h, names in zip(family, companion) if a["name"] in names])
+            for a in data["attractions"] if a["name"] not in blocked
+        ]
+        return per_child, together
+
+    assert [a["name"] for a, _ in family_walks()[1]] == [a.name for a, _ in snapshot.family(family)["together"]]
+    print(f"family (scale={scale}, heights={family})")
+    print(f"  categorize_by_height walks  {timeit(family_walks):8.2f} us")
+    print(f"  Snapshot.family             {timeit(lambda: snapshot.family(family)):8.2f} us")
+
+
+def bench_serialization(scale: int) -> None:
+    """Encode/decode speed and size of the attractions document per format"""
+    from serialization import CODECS, SectionReader, dumps_sections, get_codec
+
+    data = sample_data(scale)
+    print(f"serialization (scale={scale})")
+    print(f"  {'format':<22} {'bytes':>9} {'encode us':>11} {'decode us':>11}")
+
+    for name, codec in CODECS.items():
+        encoded = codec.encode(data)
+        encode = timeit(lambda: codec.encode(data), repeat=20)
+        decode = timeit(lambda: codec.decode(encoded), repeat=20)
+        print(f"  {name:<22} {len(encoded):>9} {encode:>11.1f} {decode:>11.1f}")
+
+    for name in ("json", "msgpack"):
+        if name not in CODECS:
+            continue
+        codec = get_codec(name)
+        container = dumps_sections(data, codec)
+        encode = timeit(lambda: dumps_sections(data, codec), repeat=20)
+        decode = timeit(lambda: SectionReader(container).load(), repeat=20)
+        print(f"  {'sections/' + name:<22} {len(container):>9} {encode:>11.1f} {decode:>11.1f}")
+        for section in ("sources", "height_ranges"):
+            decode = timeit(lambda: SectionReader(container).read(section), repeat=20)
+            print(f"  {'  only ' + section:<22} {'':>9} {'':>11} {decode:>11.1f}")
+
+
+def bench_compression(scale: int) -> None:
+    """Bytes saved vs. CPU spent per encoder and level on the real response bodies"""
+    from app import HTML_TEMPLATE, LEAN_TEMPLATE, _page_context, app, lean_payload
+    from compression import DYNAMIC_LEVELS, ENCODERS, PRECOMPRESS_LEVELS, WORKER_LEVELS, compress
+    from model import Snapshot
+    from flask import render_template_string
+    from serialization import get_codec
+
+    snapshot = Snapshot.from_dict(sample_data(scale))
+    with app.test_request_context():
+        bodies = {
+            "full page": render_template_string(HTML_TEMPLATE, **_page_context(snapshot)).encode(),
+            "lean page": render_template_string(
+                LEAN_TEMPLATE, lean_payload=lean_payload(snapshot), **_page_context(snapshot)
+            ).encode(),
+            "/api/data": get_codec("json").encode(snapshot.to_dict()),
+        }
+
+    print(f"compression (scale={scale}; published bodies pay in the writer, worker ones once per generation, dynamic ones per request)")
+    print(f"  {'body':<10} {'encoding':<9} {'bytes':>9} {'ratio':>7} {'encode us':>11}")
+    for label, raw in bodies.items():
+        print(f"  {label:<10} {'identity':<9} {len(raw):>9} {1:>7.1f} {0:>11.1f}")
+        for encoding in ENCODERS:
+            for level in sorted({1, DYNAMIC_LEVELS[encoding], WORKER_LEVELS[encoding], PRECOMPRESS_LEVELS[encoding]}):
+                encoded = compress(raw, encoding, level)
+                encode = timeit(lambda: compress(raw, encoding, level), repeat=3)
+                name = f"{encoding}-{level}"
+                print(f"  {'':<10} {name:<9} {len(encoded):>9} {len(raw) / len(encoded):>7.1f} {encode:>11.1f}")
+
+
+def bench_bootstrap(scale: int) -> None:
+    """Cold start on a fresh volume: embedded data -> stored document -> published snapshot"""
+    import os
+    import tempfile
+    from model import Snapshot
+    from scraper import bootstrap_data
+
+    data = bootstrap_data()
+    print("bootstrap")
+    print(f"  bootstrap_data()        {timeit(bootstrap_data, repeat=20):10.1f} us")
+    print(f"  Snapshot.from_dict      {timeit(lambda: Snapshot.from_dict(data), repeat=20):10.1f} us")
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, str(Path(__file__).with_name("scraper.py")), "--bootstrap"],
+            env=dict(os.environ, DATA_DIR=data_dir), capture_output=True, check=True,
+        )
+        elapsed = time.perf_counter() - start
+    print(f"  scraper.py --bootstrap  {elapsed * 1000:10.1f} ms (fresh interpreter, json storage)")
+
+
+class _FakeSession:
+    """Serves a synthetic attraction page (~150 KB, like the real ones) after a fixed latency"""
+
+    def __init__(self, latency: float):
+        filler = "".join(f"<div class='teaser'><a href='/x/{i}'>Fairy tale {i}</a><p>Lorem ipsum dolor sit amet</p></div>"
+                         for i in range(1500))
+        self.text = (f"<html><body>{filler}<p>Minimum length 1.20 m. Children &lt; 1.00 m with company aged 16."
+                     f" Accessible by wheelchair with a transfer. Single rider.</p></body></html>")
+        self.content = self.text.encode()
+        self.status_code = 200
+        self.latency = latency
+
+    def get(self, url, timeout=None):
+        time.sleep(self.latency)
+        return self
+
+    def raise_for_status(self):
+        pass
+
+
+def bench_scrape(scale: int) -> None:
+    """Serial scrape vs. the fetch thread / parse process pipeline, offline against synthetic pages"""
+    import os
+    import scraper
+
+    slugs = {f"{slug}-{i}": info for i in range(scale) for slug, info in scraper.ATTRACTION_SLUGS.items()}
+    session = _FakeSession(latency=0.02)
+    scraper.FETCH_DELAY = 0
+    print(f"scrape ({len(slugs)} pages of {len(session.text) // 1024} KB, 20 ms latency, {os.cpu_count()} cpus)")
+
+    start = time.perf_counter()
+    serial = [scraper.scrape_efteling_attraction(slug, info, session) for slug, info in slugs.items()]
+    print(f"  serial                       {time.perf_counter() - start:8.2f} s")
+    for parse_workers in sorted({1, 2, os.cpu_count() or 1}):
+        start = time.perf_counter()
+        result = scraper.scrape_all_attractions(session, fetch_workers=8, parse_workers=parse_workers, slugs=slugs)
+        elapsed = time.perf_counter() - start
+        assert result == serial
+        print(f"  pipeline, {parse_workers} parse workers   {elapsed:8.2f} s")
+
+
+def _legacy_categorize_by_height(attractions: list, height_cm: int) -> dict:
+    """The per-attraction loop scraper.py and wait_times.py used before rules.py, kept as baseline (test_rules.py)"""
+    result = {'independent': [], 'with_companion': [], 'not_available': []}
+    for attr in attractions:
+        min_h = attr.get("min_height_cm")
+        supervision_h = attr.get("supervision_height_cm")
+        if min_h is None and supervision_h is None:
+            result['independent'].append(attr)
+        elif min_h is None and supervision_h is not None:
+            if height_cm >= supervision_h:
+                result['independent'].append(attr)
+            else:
+                result['with_companion'].append(attr)
+        elif min_h is not None:
+            if height_cm >= min_h:
+                result['independent'].append(attr)
+            elif supervision_h is not None and height_cm >= supervision_h:
+                result['with_companion'].append(attr)
+            else:
+                result['not_available'].append(attr)
+    return result
+
+
+def bench_rules(scale: int) -> None:
+    """Cost of the threshold matrix against the old loop (parity is checked by test_rules.py)"""
+    from rules import HEIGHTS, MAX_HEIGHT, MIN_HEIGHT, CategoryMatrix, categorize_heights, height_pairs, height_ranges
+    from model import Snapshot
+
+    data = sample_data(scale)
+    attractions = data["attractions"]
+    heights = range(MIN_HEIGHT, MAX_HEIGHT + 1)
+
+    ranges = Snapshot.from_dict(data).height_ranges
+    print(f"rules (scale={scale}, {len(attractions)} attractions, parity: python -m pytest test_rules.py)")
+
+    legacy_size = len(json.dumps(categorize_heights(attractions), ensure_ascii=False))
+    ranges_size = len(json.dumps(height_ranges(attractions), ensure_ascii=False))
+    print(f"  stored: {len(HEIGHTS)} buckets {legacy_size} bytes, "
+          f"{len(ranges.breakpoints)} ranges for {MIN_HEIGHT}-{MAX_HEIGHT} cm {ranges_size} bytes")
+
+    def legacy_buckets():
+        return {str(h): _legacy_categorize_by_height(attractions, h) for h in HEIGHTS}
+
+    def legacy_dense():
+        return [_legacy_categorize_by_height(attractions, h) for h in heights]
+
+    pairs = height_pairs(attractions)
+    print(f"  {len(HEIGHTS)} buckets, legacy loop      {timeit(legacy_buckets, repeat=20):10.1f} us")
+    print(f"  {len(HEIGHTS)} buckets, categorize_heights {timeit(lambda: categorize_heights(attractions), repeat=20):8.1f} us")
+    print(f"  {len(heights)} heights, legacy loop     {timeit(legacy_dense, repeat=5):10.1f} us")
+    print(f"  {len(heights)} heights, CategoryMatrix  {timeit(lambda: CategoryMatrix.build(pairs, heights), repeat=20):10.1f} us")
+    print(f"  {len(heights)} heights, height_ranges   {timeit(lambda: height_ranges(attractions), repeat=20):10.1f} us")
+    print(f"  range lookup, one height       {timeit(lambda: ranges.lookup(117), repeat=2000):10.3f} us")
+
+
+def bench_matching(scale: int) -> None:
+    """Queue-Times name matching: NAME_MAPPING parity, renamed variants, cost per fetch"""
+    import wait_times
+    from matching import NameMatcher
+    from scraper import ATTRACTION_SLUGS
+
+    names = [info["name"] for info in ATTRACTION_SLUGS.values()]
+    matcher = NameMatcher(names + list(wait_times.NAME_MAPPING.values()), wait_times.NAME_MAPPING)
+    for upstream, ours in wait_times.NAME_MAPPING.items():
+        assert matcher.match(upstream) == ours, upstream
+    for name in names:
+        assert matcher.match(name) == name, name
+    # What an upstream rename typically looks like: accents, case, punctuation, articles, tracks
+    renamed = {
+        "Pirana": "Piraña", "max and moritz": "Max & Moritz", "Vliegende Hollander": "De Vliegende Hollander",
+        "Villa-Volta": "Villa Volta", "Baron1898": "Baron 1898", "Joris & de Draak (Water)": "Joris en de Draak",
+        "Anton Pieck Plein": "Anton Pieckplein", "Droomvlucht (single rider)": "Droomvlucht",
+    }
+    for upstream, ours in renamed.items():
+        assert matcher.match(upstream) == ours, upstream
+    print(f"matching (scale={scale}, {len(wait_times.NAME_MAPPING)} aliases and {len(renamed)} renames checked)")
+
+    rides = [
+        {"id": i * 1000 + n, "name": upstream, "is_open": True, "wait_time": 5 * n, "last_updated": None}
+        for i in range(scale) for n, upstream in enumerate(names + list(wait_times.NAME_MAPPING) + list(renamed))
+    ]
+    response = {"lands": [{"rides": rides}]}
+
+    def legacy():
+        return {wait_times.NAME_MAPPING.get(r["name"], r["name"]): r for r in rides}
+
+    print(f"  {len(rides)} rides, NAME_MAPPING lookup  {timeit(legacy, repeat=200):10.1f} us")
+    print(f"  {len(rides)} rides, matcher uncached     {timeit(lambda: [matcher.match(r['name']) for r in rides], repeat=20):10.1f} us")
+    wait_times.parse_wait_times(response)
+    print(f"  {len(rides)} rides, parse_wait_times     {timeit(lambda: wait_times.parse_wait_times(response), repeat=200):10.1f} us")
+    print(f"  fuzzy lookup, one name          {timeit(lambda: matcher.similar('vliegende holander'), repeat=2000):10.3f} us")
+
+
+def _import_times(module: str) -> list:
+    """(cumulative us, name, depth) per import of a fresh `python -X importtime -c "import module"`"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    ).stderr
+    times = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times.append((int(cumulative), name.strip(), (len(name) - len(name.lstrip()) - 1) // 2))
+    return times
+
+
+def bench_imports(scale: int) -> None:
+    """Import cost of the entry points, as paid by every cron run and worker start"""
+    print("imports (python -X importtime, fresh interpreter each)")
+    for module in ("wait_times", "scraper", "storage", "app"):
+        times = _import_times(module)
+        end = next(i for i, (_, name, depth) in enumerate(times) if name == module and depth == 0)
+        total = times[end][0]
+        # importtime lists children before their parent, so the module's subtree directly precedes it
+        start = end
+        while start > 0 and times[start - 1][2] > 0:
+            start -= 1
+        children = sorted(((us, name) for us, name, depth in times[start:end] if depth == 1), reverse=True)[:3]
+        heaviest = ", ".join(f"{name} {us / 1000:.1f}" for us, name in children)
+        print(f"  {module:<11} {total / 1000:7.1f} ms   ({heaviest})")
+
+
+SECTIONS = {
+    "memory": bench_memory,
+    "query": bench_query,
+    "serialization": bench_serialization,
+    "compression": bench_compression,
+    "rules": bench_rules,
+    "matching": bench_matching,
+    "imports": bench_imports,
+    "bootstrap": bench_bootstrap,
+    "scrape": bench_scrape,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("sections", nargs="*", help=f"sections to run (default: all of {', '.join(SECTIONS)})")
+    parser.add_argument("--scale", type=int, default=1, help="repeat the attraction list N times")
+    parser.add_argument("--rss-child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.rss_child:
+        _rss_child(args.rss_child, args.scale)
+        return
+
+    unknown = set(args.sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"unknown sections: {', '.join(sorted(unknown))}")
+
+    for name in args.sections or SECTIONS:
+        SECTIONS[name](args.scale)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Efteling Upstream Circuit Breakers
+One breaker per upstream host, shared by every run through a small state file in DATA_DIR.
+
+    closed     requests go through; consecutive failures are counted
+    open       after CIRCUIT_FAILURES failures in a row: no requests for CIRCUIT_COOLDOWN
+               seconds, the writers keep the last good data, which the UI shows as stale
+    half_open  cool-down over: one probe (leader.probe_upstreams, or the next run) decides,
+               success closes the breaker, failure opens it for another cool-down
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(os.environ.get("DATA_DIR", "/app/data"))
+
+CIRCUIT_FAILURES = int(os.environ.get("CIRCUIT_FAILURES", "3"))
+CIRCUIT_COOLDOWN = float(os.environ.get("CIRCUIT_COOLDOWN", "600"))
+
+# Connection attempts fail fast; a host that accepts but answers slowly still gets the read timeout
+CONNECT_TIMEOUT = 5
+
+
+def is_outage(http_status: Optional[int]) -> bool:
+    """Whether a fetch result says the host is down (no response or a server error), not just the page"""
+    return http_status is None or http_status >= 500
+
+
+class CircuitBreaker:
+    """Failure counter with cool-down for one host; thread safe, persisted on every change"""
+
+    def __init__(self, host: str, data_dir: Path = DATA_DIR, failures: int = CIRCUIT_FAILURES,
+                 cooldown: float = CIRCUIT_COOLDOWN):
+        self.host = host
+        self.threshold = failures
+        self.cooldown = timedelta(seconds=cooldown)
+        self.state_file = Path(data_dir) / f"circuit-{host}.json"
+        self._lock = threading.Lock()
+        self._status = self._load()
+
+    @classmethod
+    def for_url(cls, url: str, **kwargs) -> "CircuitBreaker":
+        return cls(urlsplit(url).hostname, **kwargs)
+
+    def _load(self) -> dict:
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {"host": self.host, "failures": 0, "opened_at": None, "last_success": None, "last_failure": None}
+
+    def _save(self) -> None:
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.state_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump(self._status, f)
+        os.replace(tmp_file, self.state_file)
+
+    @property
+    def state(self) -> str:
+        opened_at = self._status["opened_at"]
+        if opened_at is None:
+            return "closed"
+        if datetime.now(timezone.utc) < datetime.fromisoformat(opened_at) + self.cooldown:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        """Whether a request may go out now (closed, or half open for the probe)"""
+        return self.state != "open"
+
+    def retry_at(self) -> Optional[datetime]:
+        opened_at = self._status["opened_at"]
+        return None if opened_at is None else datetime.fromisoformat(opened_at) + self.cooldown
+
+    def record_success(self) -> bool:
+        """Close the breaker; True if it was not closed before"""
+        with self._lock:
+            was_closed = self._status["opened_at"] is None
+            self._status.update(failures=0, opened_at=None, last_success=_now())
+            self._save()
+        if not was_closed:
+            logger.info(f"{self.host} is reachable again, circuit closed")
+        return not was_closed
+
+    def record_failure(self) -> bool:
+        """Count a failure, (re)opening the breaker at the threshold; True if it just opened"""
+        with self._lock:
+            self._status["failures"] += 1
+            self._status["last_failure"] = _now()
+            # requests still in flight when the breaker opened don't extend the cool-down
+            opened = self._status["failures"] >= self.threshold and self.state != "open"
+            if opened:
+                self._status["opened_at"] = self._status["last_failure"]
+            self._save()
+        if opened:
+            logger.warning(f"{self.host} failed {self._status['failures']} times in a row, "
+                           f"circuit open for {self.cooldown.total_seconds():.0f}s")
+        return opened
+
+    def status(self) -> dict:
+        return dict(self._status, state=self.state)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def failing_upstreams(data_dir: Path = DATA_DIR) -> Dict[str, dict]:
+    """
+    Hosts whose breaker is not closed, {host: {"state", "opened_at", "last_success"}};
+    empty while everything is reachable, so it only changes when a breaker does
+    """
+    upstreams = {}
+    for path in sorted(Path(data_dir).glob("circuit-*.json")):
+        status = CircuitBreaker(path.name[len("circuit-"):-len(".json")], data_dir).status()
+        if status["state"] != "closed":
+            upstreams[status["host"]] = {key: status[key] for key in ("state", "opened_at", "last_success")}
+    return upstreams
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Efteling Response Cache
+Prepared response bodies per (data generation, route, normalized query), evicted least
+recently used first once the entry or byte budget is reached, and after a time to live.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+
+from compression import PreparedBody
+
+RESPONSE_CACHE_ENTRIES = int(os.environ.get("RESPONSE_CACHE_ENTRIES", "1024"))
+RESPONSE_CACHE_BYTES = int(os.environ.get("RESPONSE_CACHE_MB", "32")) * 1024 * 1024
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "3600"))
+
+COUNTERS = ("hits", "misses", "evictions", "expirations")
+
+
+def body_size(body: PreparedBody) -> int:
+    return len(body.raw) + sum(len(data) for data in body.encoded.values())
+
+
+class ResponseCache:
+    """
+    Keys are (generation, route, *params). Entries of an older generation are never hit
+    again; clear() drops them as soon as a new one is loaded, the LRU order otherwise.
+    Counters are kept per route, so a high-cardinality route shows up with a low hit rate.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_ENTRIES, max_bytes: int = RESPONSE_CACHE_BYTES,
+                 ttl: float = RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (body, size, expires)
+        self._bytes = 0
+        self._routes = {}  # route -> counters
+        self._lock = threading.Lock()
+
+    def _count(self, route: Hashable, counter: str) -> None:
+        counters = self._routes.get(route)
+        if counters is None:
+            counters = self._routes[route] = dict.fromkeys(COUNTERS, 0)
+        counters[counter] += 1
+
+    def _remove(self, key: Tuple, counter: Optional[str] = None) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        if counter:
+            self._count(key[1], counter)
+
+    def get(self, key: Tuple) -> Optional[PreparedBody]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= time.monotonic():
+                self._remove(key, "expirations")
+                entry = None
+            if entry is None:
+                self._count(key[1], "misses")
+                return None
+            self._entries.move_to_end(key)
+            self._count(key[1], "hits")
+            return entry[0]
+
+    def put(self, key: Tuple, body: PreparedBody, alias: bool = False) -> PreparedBody:
+        """alias: body is already cached under another key, don't count its bytes twice"""
+        size = 0 if alias else body_size(body)
+        if size > self.max_bytes:
+            return body  # would evict everything else, serve it uncached
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (body, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)), "evictions")
+        return body
+
+    def get_or_build(self, key: Tuple, build: Callable[[], PreparedBody]) -> PreparedBody:
+        body = self.get(key)
+        return body if body is not None else self.put(key, build())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def metrics(self) -> dict:
+        """Size and hit rates, overall and per route"""
+        with self._lock:
+            routes = {route: dict(counters, entries=0, bytes=0) for route, counters in self._routes.items()}
+            for key, (_, size, _) in self._entries.items():
+                route = routes[key[1]]
+                route["entries"] += 1
+                route["bytes"] += size
+        for counters in routes.values():
+            lookups = counters["hits"] + counters["misses"]
+            counters["hit_rate"] = round(counters["hits"] / lookups, 3) if lookups else None
+        hits = sum(c["hits"] for c in routes.values())
+        lookups = hits + sum(c["misses"] for c in routes.values())
+        return {
+            "entries": sum(c["entries"] for c in routes.values()),
+            "bytes": sum(c["bytes"] for c in routes.values()),
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+            "routes": {str(route): counters for route, counters in sorted(routes.items(), key=lambda r: str(r[0]))},
+        }
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Efteling Response Compression
+gzip / brotli encoders, Accept-Encoding negotiation and bodies precompressed once per data generation
+"""
+
+import gzip
+import zlib
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional
+
+try:
+    import brotli
+except ImportError:  # optional, responses are then only gzipped
+    brotli = None
+
+# Bodies the writers publish are compressed outside any request and can afford the
+# smallest output. Bodies a web worker prepares once per data generation still run
+# in the first request after a publish: brotli 11 takes ~240 ms on the full page,
+# 9 about 15 ms for 10% more bytes. Dynamic responses pay per request.
+PRECOMPRESS_LEVELS = {"br": 11, "gzip": 9}
+WORKER_LEVELS = {"br": 9, "gzip": 9}
+DYNAMIC_LEVELS = {"br": 4, "gzip": 6}
+
+# Below this the saved bytes don't pay for the CPU and the extra header
+MIN_SIZE = 512
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/x-ndjson", "image/svg+xml")
+
+
+def _gzip(raw: bytes, level: int) -> bytes:
+    return gzip.compress(raw, compresslevel=level, mtime=0)
+
+
+def _brotli(raw: bytes, level: int) -> bytes:
+    return brotli.compress(raw, quality=level)
+
+
+# Content-Encoding -> encoder, in server preference order
+ENCODERS = {"gzip": _gzip}
+if brotli is not None:
+    ENCODERS = {"br": _brotli, **ENCODERS}
+
+
+def compress(raw: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """Encode raw bytes; level defaults to the on-the-fly setting"""
+    return ENCODERS[encoding](raw, DYNAMIC_LEVELS[encoding] if level is None else level)
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Incrementally encode a streamed body; memory stays at the compressor window"""
+    if encoding == "gzip":
+        compressor = zlib.compressobj(DYNAMIC_LEVELS["gzip"], zlib.DEFLATED, 31)  # 31: gzip container
+        process, finish = compressor.compress, compressor.flush
+    else:
+        compressor = brotli.Compressor(quality=DYNAMIC_LEVELS["br"])
+        process, finish = compressor.process, compressor.finish
+    for chunk in chunks:
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+def negotiate(accept_encodings, available: Iterable[str] = ENCODERS) -> Optional[str]:
+    """First available encoding the client accepts (werkzeug Accept object), None for identity"""
+    for encoding in available:
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def is_compressible(mimetype: Optional[str]) -> bool:
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+class PreparedBody(NamedTuple):
+    """Immutable response body plus its precompressed variants"""
+    raw: bytes
+    encoded: Dict[str, bytes]
+
+    @classmethod
+    def build(cls, raw: bytes, levels: Dict[str, int] = PRECOMPRESS_LEVELS) -> "PreparedBody":
+        """levels: WORKER_LEVELS in web workers, DYNAMIC_LEVELS for rarely reused high-cardinality queries"""
+        encoded = {}
+        if len(raw) >= MIN_SIZE:
+            for encoding in ENCODERS:
+                data = compress(raw, encoding, levels[encoding])
+                if len(data) < len(raw):
+                    encoded[encoding] = data
+        return cls(raw, encoded)
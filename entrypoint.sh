@@ -6,18 +6,28 @@ echo "Starting Efteling Height Requirements Service..."
 touch /var/log/scraper.log
 touch /var/log/wait_times.log
 
-# Run initial height requirements scrape
-echo "Running initial data scrape..."
-python /app/scraper.py
+# On a fresh volume, publish the data embedded in scraper.py (no network, milliseconds)
+python /app/scraper.py --bootstrap
 
-# Run initial wait times fetch
-echo "Running initial wait times fetch..."
-python /app/wait_times.py || echo "Wait times fetch failed (park may be closed)"
+# Several replicas (SHARED_CACHE_URL or LEADER_ELECTION=file): hold or wait for the
+# leader lease, only the leader runs the scraper and wait times jobs below and from cron.
+# The leader (every replica without an election) also probes upstreams after a breaker cool-down.
+python /app/leader.py >> /var/log/leader.log 2>&1 &
 
-# Start cron daemon in background
+# Refresh data in the background; the web server starts right away with the
+# last published snapshot and picks up the new one when the scrape is done
+echo "Starting initial data refresh in the background..."
+(
+    python /app/scraper.py
+    python /app/wait_times.py || echo "Wait times fetch failed (park may be closed)"
+) &
+
+# Start cron daemon in background. Its jobs get an empty environment, so save ours
+# for them: without it they would use JSON storage, no shared cache and no election.
 echo "Starting cron scheduler..."
+export -p > /app/cron.env
 cron
 
 # Start web server with gunicorn
 echo "Starting web server on port ${PORT:-5000}..."
-exec gunicorn --bind 0.0.0.0:${PORT:-5000} --workers 2 --timeout 120 app:app
+exec gunicorn --config /app/gunicorn.conf.py app:app
@@ -0,0 +1,32 @@
+"""
+Gunicorn configuration
+The data snapshot is loaded once in the master before fork, so every worker
+starts out sharing the same copy-on-write pages instead of parsing its own.
+Snapshots published later are mapped from snapshot.efts: the bodies the writer prepared
+(/api/data, /api/height) are served from the shared page cache, while the model behind
+the pages and queries is still built by each worker that needs it.
+"""
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+timeout = 120
+
+# Import app.py (and load the snapshot) in the master process
+preload_app = True
+
+
+def when_ready(server):
+    """Warm the snapshot in the master before any worker is forked"""
+    import app
+    if app.get_snapshot() is None:
+        server.log.info("No data snapshot yet, workers will load it on first request")
+
+
+def pre_fork(server, worker):
+    """Move everything allocated so far out of the collector's reach.
+    Otherwise the first GC pass in each worker writes to every object header
+    and un-shares the copy-on-write pages."""
+    gc.freeze()
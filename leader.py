@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Efteling Leader Election
+With several replicas, only the holder of the leader lease scrapes Efteling.com and
+polls Queue-Times.com, so upstream load stays the same however many replicas run
+and only one of them writes the data volume.
+
+The lease lives in one of (LEADER_ELECTION):
+    auto    the shared cache if SHARED_CACHE_URL is set, otherwise no election
+    shared  the shared cache (shared.py)
+    file    DATA_DIR/leader.lease on the volume all replicas mount, updated under an
+            fcntl lock; no Redis needed
+    off     no election, every replica runs every job
+
+Run `python leader.py` in the background of every replica: it renews the lease every
+LEADER_TTL / 3 seconds while it holds it and tries to take it over otherwise, so a
+failed leader is replaced after at most LEADER_TTL seconds. On the same beat the
+leader (without an election: every replica) probes upstreams whose circuit breaker
+cooled down, so a recovered host stops being shown as stale right away instead of
+at its job's next run, which is up to six hours away for the scraper.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from shared import REPLICA_ID, get_shared
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(os.environ.get("DATA_DIR", "/app/data"))
+
+LEADER_ELECTION = os.environ.get("LEADER_ELECTION", "auto")
+LEADER_TTL = float(os.environ.get("LEADER_TTL", "60"))
+
+LEASE = "leader"
+
+
+class FileLeases:
+    """
+    Leases as small JSON files {"owner", "expires_at"} in a shared directory. Every read-modify-write
+    happens under an exclusive fcntl lock on the file, which also holds across containers on one host
+    and on NFS. Expiry is wall clock time, so the replicas' clocks have to agree (NTP).
+    """
+
+    def __init__(self, data_dir: Path = DATA_DIR):
+        self.data_dir = Path(data_dir)
+
+    def _update(self, name: str, change) -> Optional[dict]:
+        """Apply change(lease or None) -> new lease, None to keep it; returns the lease in effect"""
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.data_dir / f"{name}.lease", "a+") as f:
+            fcntl.lockf(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    lease = json.loads(f.read())
+                except ValueError:  # new (empty) file
+                    lease = None
+                if not lease or lease["expires_at"] <= time.time():
+                    lease = None  # free: never taken, released or expired
+                updated = change(lease)
+                if updated is not None and updated != lease:
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(updated))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    lease = updated or None
+                return lease
+            finally:
+                fcntl.lockf(f, fcntl.LOCK_UN)
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Take the lease if it is free or expired, renew it if owner holds it; True if owner holds it now"""
+        lease = self._update(name, lambda lease: (
+            lease if lease and lease["owner"] != owner else {"owner": owner, "expires_at": time.time() + ttl}
+        ))
+        return lease["owner"] == owner
+
+    def release_lease(self, name: str, owner: str) -> None:
+        self._update(name, lambda lease: {} if lease and lease["owner"] == owner else None)
+
+    def lease_owner(self, name: str) -> Optional[str]:
+        lease = self._update(name, lambda lease: None)
+        return lease["owner"] if lease else None
+
+
+def lease_store():
+    """Where the leader lease lives (see LEADER_ELECTION), None when there is no election"""
+    if LEADER_ELECTION == "file":
+        return FileLeases()
+    if LEADER_ELECTION in ("auto", "shared"):
+        shared = get_shared()
+        if shared is None and LEADER_ELECTION == "shared":
+            raise ValueError("LEADER_ELECTION=shared requires SHARED_CACHE_URL")
+        return shared
+    if LEADER_ELECTION == "off":
+        return None
+    raise ValueError(f"Unknown LEADER_ELECTION {LEADER_ELECTION!r}, expected auto, shared, file or off")
+
+
+def is_leader() -> bool:
+    """
+    Whether this replica may run the upstream jobs: always without an election,
+    otherwise if it holds (or can take) the lease. If the lease store is unreachable
+    every replica runs them, as before replicas existed, rather than none.
+    """
+    store = lease_store()
+    if store is None:
+        return True
+    try:
+        return store.acquire_lease(LEASE, REPLICA_ID, LEADER_TTL)
+    except Exception as e:
+        logger.warning(f"Leader election unavailable, running anyway: {e}")
+        return True
+
+
+def probe_upstreams() -> None:
+    """Probe the upstreams whose breaker is half open; republish if one closed, to clear the stale mark"""
+    import scraper
+    import wait_times
+    from storage import publish_snapshot
+
+    recovered = False
+    for job in (scraper, wait_times):
+        try:
+            recovered = job.probe() or recovered
+        except Exception as e:
+            logger.warning(f"Probing the {job.__name__} upstream failed: {e}")
+    if recovered:
+        publish_snapshot()
+
+
+def run_heartbeat(interval: float = LEADER_TTL / 3) -> None:
+    """Hold or wait for the lease until the process is stopped, probing upstreams while leading"""
+    leading = None
+    while True:
+        now_leading = is_leader()
+        if now_leading != leading:
+            logger.info(f"Replica {REPLICA_ID} is {'the leader' if now_leading else 'a follower'}")
+            leading = now_leading
+        if leading:
+            probe_upstreams()
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if lease_store() is None:
+        logger.info("No leader election, this replica runs every job itself")
+    run_heartbeat()
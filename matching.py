@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Efteling Name Matching
+Maps upstream ride names (Queue-Times.com) onto our attraction names. Names are compared
+normalized: no accents, punctuation, case or filler words ("de", "en", "&", ...), so
+"Pirana" finds "Piraña" and "Max and Moritz" finds "Max & Moritz", and without spaces, so
+"Baron1898" finds "Baron 1898". What is still different is matched by trigram similarity
+over an index built once per matcher; such a match is a guess (see NameMatcher.exact).
+"""
+
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set
+
+# Words that come and go in ride names without changing which ride is meant
+STOPWORDS = frozenset({"de", "het", "een", "en", "the", "and"})
+
+# Least Dice similarity of the trigram sets for a fuzzy match. Lower lets unrelated rides
+# through: "Carrousel" scores 0.64 against "Stoomcarrousel".
+MATCH_THRESHOLD = 0.8
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+_NUMBER = re.compile(r"[0-9]+")
+
+# " - Vuur", ": Water", " (Track 2)": one track of a ride
+_TRACK_SUFFIX = re.compile(r"(\s+[-–—]\s+|\s*[:(]).*$")
+
+
+def normalize_name(name: str) -> str:
+    """'De Vliegende Hollander!' -> 'vliegende hollander'"""
+    decomposed = unicodedata.normalize("NFKD", name)
+    plain = "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+    return " ".join(word for word in _NON_WORD.split(plain) if word and word not in STOPWORDS)
+
+
+def trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameMatcher:
+    """
+    Exact lookup of normalized names and aliases, then trigram similarity. The postings
+    (trigram -> names containing it) are built once, so a fuzzy lookup only scores the
+    names sharing a trigram with the query instead of comparing against every name.
+    Names with different numbers are never similar: "Python 2" is not "Python".
+    """
+
+    def __init__(self, names: Iterable[str], aliases: Optional[Dict[str, str]] = None,
+                 threshold: float = MATCH_THRESHOLD):
+        self.threshold = threshold
+        self._exact = {}  # normalized name or alias -> name
+        for name in names:
+            self._exact.setdefault(normalize_name(name), name)
+        for alias, name in (aliases or {}).items():
+            self._exact[normalize_name(alias)] = name
+        self._compact = {}  # normalized name or alias without spaces -> name
+        for key, name in self._exact.items():
+            self._compact.setdefault(key.replace(" ", ""), name)
+        self._targets: List[str] = list(self._exact.values())
+        self._numbers: List[List[str]] = [_NUMBER.findall(key) for key in self._exact]
+        self._sizes: List[int] = []
+        self._postings: Dict[str, List[int]] = {}
+        for i, key in enumerate(self._exact):
+            grams = trigrams(key)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(i)
+
+    def match(self, name: str) -> Optional[str]:
+        """Our name for an upstream name, None if nothing is similar enough"""
+        found = self.exact(name)
+        return found if found is not None else self.similar(normalize_name(name))
+
+    def exact(self, name: str) -> Optional[str]:
+        """Our name for an upstream name that equals a name or alias once normalized, or one of its tracks"""
+        found = self._lookup(normalize_name(name))
+        if found is None:
+            base = _TRACK_SUFFIX.sub("", name)
+            if base and base != name:
+                found = self._lookup(normalize_name(base))
+        return found
+
+    def _lookup(self, key: str) -> Optional[str]:
+        found = self._exact.get(key)
+        return found if found is not None else self._compact.get(key.replace(" ", ""))
+
+    def similar(self, key: str) -> Optional[str]:
+        """Most similar indexed name for a normalized key, if it reaches the threshold"""
+        grams = trigrams(key)
+        shared = {}
+        for gram in grams:
+            for i in self._postings.get(gram, ()):
+                shared[i] = shared.get(i, 0) + 1
+        numbers = _NUMBER.findall(key)
+        best, best_score = None, 0.0
+        for i, count in shared.items():
+            score = 2 * count / (len(grams) + self._sizes[i])
+            if score > best_score and self._numbers[i] == numbers:
+                best, best_score = self._targets[i], score
+        return best if best_score >= self.threshold else None
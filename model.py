@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+Efteling In-Memory Data Model
+Compact, immutable representation of the attractions document for the web workers
+"""
+
+import sys
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from rules import CATEGORIES, HEIGHTS, INDEPENDENT, WITH_COMPANION, CategoryMatrix, height_ranges
+
+# Bumped whenever the published snapshot document changes, so files from an
+# older version are rebuilt instead of loaded
+MODEL_VERSION = 5
+
+# Access conditions packed into one int per attraction.
+# wheelchair is a three-valued field, so every value gets its own bit.
+ACCESS_BITS = {
+    ("wheelchair", "accessible"): 1 << 0,
+    ("wheelchair", "transfer"): 1 << 1,
+    ("wheelchair", "not_accessible"): 1 << 2,
+    ("pregnant", True): 1 << 3,
+    ("injuries", True): 1 << 4,
+    ("cameras", True): 1 << 5,
+    ("guide_dogs", True): 1 << 6,
+    ("single_rider", True): 1 << 7,
+    ("dark", True): 1 << 8,
+    ("loud", True): 1 << 9,
+    ("wet", True): 1 << 10,
+    ("dizzy", True): 1 << 11,
+    ("fog", True): 1 << 12,
+    ("fire", True): 1 << 13,
+    ("surprising", True): 1 << 14,
+}
+
+WHEELCHAIR_VALUES = ("accessible", "transfer", "not_accessible")
+
+# Boolean conditions usable in ?require= / ?exclude= queries
+ACCESS_FLAGS = {key: bit for (key, value), bit in ACCESS_BITS.items() if value is True}
+
+
+def encode_access(access: Optional[dict]) -> int:
+    """Pack an access dict into a bitmask"""
+    mask = 0
+    for key, value in (access or {}).items():
+        mask |= ACCESS_BITS.get((key, value), 0)
+    return mask
+
+
+def decode_access(mask: int) -> dict:
+    """Unpack a bitmask into the access dict used by the templates and JSON API"""
+    return {key: value for (key, value), bit in ACCESS_BITS.items() if mask & bit}
+
+
+def wheelchair_mask(values: Iterable[str]) -> int:
+    """Bits for a set of accepted wheelchair values, e.g. ["accessible", "transfer"]"""
+    return sum(ACCESS_BITS[("wheelchair", v)] for v in set(values))
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+
+def attraction_slug(attr: dict) -> Optional[str]:
+    """Stable ID of an attraction: its Efteling.com slug (from the url in documents written before slugs were stored)"""
+    if attr.get("slug"):
+        return attr["slug"]
+    url = attr.get("url")
+    return url.rstrip("/").rsplit("/", 1)[-1] if url else None
+
+
+@dataclass(frozen=True, slots=True)
+class Attraction:
+    name: str
+    name_dutch: Optional[str]
+    type: str
+    type_dutch: Optional[str]
+    min_height_cm: Optional[int]
+    supervision_height_cm: Optional[int]
+    companion_age: Optional[int]
+    advisory_age: Optional[int]
+    notes: str
+    url: str
+    slug: Optional[str]
+    category: str
+    scrape_status: Optional[str]
+    access_mask: int
+    is_open: Optional[bool] = None
+    wait_time: Optional[int] = None
+    wait_last_updated: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, attr: dict) -> "Attraction":
+        return cls(
+            name=_intern(attr["name"]),
+            name_dutch=_intern(attr.get("name_dutch")),
+            type=_intern(attr.get("type")),
+            type_dutch=_intern(attr.get("type_dutch")),
+            min_height_cm=attr.get("min_height_cm"),
+            supervision_height_cm=attr.get("supervision_height_cm"),
+            companion_age=attr.get("companion_age"),
+            advisory_age=attr.get("advisory_age"),
+            notes=attr.get("notes") or "",
+            url=attr.get("url"),
+            slug=_intern(attraction_slug(attr)),
+            category=_intern(attr.get("category")),
+            scrape_status=_intern(attr.get("scrape_status")),
+            access_mask=encode_access(attr.get("access")),
+            is_open=attr.get("is_open"),
+            wait_time=attr.get("wait_time"),
+            wait_last_updated=attr.get("wait_last_updated"),
+        )
+
+    @property
+    def access(self) -> dict:
+        return decode_access(self.access_mask)
+
+    def to_dict(self, with_wait_times: bool = False) -> dict:
+        """Rebuild the attraction dict as stored in attractions.json"""
+        attr = {
+            "name": self.name,
+            "name_dutch": self.name_dutch,
+            "type": self.type,
+            "type_dutch": self.type_dutch,
+            "min_height_cm": self.min_height_cm,
+            "supervision_height_cm": self.supervision_height_cm,
+            "companion_age": self.companion_age,
+            "advisory_age": self.advisory_age,
+            "notes": self.notes,
+            "access": self.access,
+            "url": self.url,
+            "slug": self.slug,
+            "category": self.category,
+            "scrape_status": self.scrape_status,
+        }
+        if with_wait_times:
+            attr["is_open"] = self.is_open
+            attr["wait_time"] = self.wait_time
+            attr["wait_last_updated"] = self.wait_last_updated
+        return attr
+
+
+@dataclass(frozen=True, slots=True)
+class Categories:
+    """Attractions per category for one height; tuples share the Attraction objects"""
+    independent: Tuple[Attraction, ...]
+    with_companion: Tuple[Attraction, ...]
+    not_available: Tuple[Attraction, ...]
+
+    def to_dict(self, with_wait_times: bool = False) -> dict:
+        return {
+            category: [a.to_dict(with_wait_times) for a in getattr(self, category)]
+            for category in CATEGORIES
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class HeightRanges:
+    """
+    Categories for every height between min_height and max_height, stored once per range
+    (see rules.height_ranges); a lookup is one bisect over the breakpoints.
+    """
+    min_height: int
+    max_height: int
+    breakpoints: Tuple[int, ...]
+    codes: Tuple[str, ...]
+    categories: Tuple[Categories, ...]
+
+    @classmethod
+    def from_dict(cls, ranges: dict, attractions: Tuple[Attraction, ...]) -> "HeightRanges":
+        codes = tuple(ranges["codes"])
+        return cls(
+            min_height=ranges["min_height"],
+            max_height=ranges["max_height"],
+            breakpoints=tuple(ranges["breakpoints"]),
+            codes=codes,
+            categories=tuple(
+                Categories(*(
+                    tuple(a for a, c in zip(attractions, code) if c == digit)
+                    for digit in "012"
+                ))
+                for code in codes
+            ),
+        )
+
+    def index(self, height_cm: int) -> Optional[int]:
+        """Range holding height_cm, None outside min_height..max_height"""
+        if not self.min_height <= height_cm <= self.max_height:
+            return None
+        return bisect_right(self.breakpoints, height_cm) - 1
+
+    def lookup(self, height_cm: int) -> Optional[Categories]:
+        index = self.index(height_cm)
+        return None if index is None else self.categories[index]
+
+    def to_dict(self) -> dict:
+        return {
+            "min_height": self.min_height,
+            "max_height": self.max_height,
+            "breakpoints": list(self.breakpoints),
+            "codes": list(self.codes),
+        }
+
+
+def _iter_bits(bitset: int):
+    """Yield the positions of set bits, lowest first"""
+    while bitset:
+        low = bitset & -bitset
+        yield low.bit_length() - 1
+        bitset ^= low
+
+
+@dataclass(frozen=True, slots=True)
+class AccessIndex:
+    """
+    Attractions transposed into bitsets: bit i of every set stands for attraction i.
+    Filters become a handful of AND / AND NOT operations on Python ints instead of
+    a dict lookup per attraction and condition.
+    """
+    all_set: int
+    flag_sets: Dict[int, int]  # access bit -> attractions having it
+    thresholds: Tuple[int, ...]  # sorted distinct min/supervision heights
+    independent_sets: Tuple[int, ...]  # per height segment between thresholds
+    companion_sets: Tuple[int, ...]
+
+    @classmethod
+    def build(cls, attractions: Tuple[Attraction, ...]) -> "AccessIndex":
+        flag_sets = {bit: 0 for bit in ACCESS_BITS.values()}
+        for i, attr in enumerate(attractions):
+            for bit in _iter_bits(attr.access_mask):
+                flag_sets[1 << bit] |= 1 << i
+
+        thresholds = tuple(sorted(
+            {a.min_height_cm for a in attractions if a.min_height_cm is not None}
+            | {a.supervision_height_cm for a in attractions if a.supervision_height_cm is not None}
+        ))
+        # Categories only change at a threshold, so one representative height per segment suffices
+        representatives = [(thresholds[0] - 1) if thresholds else 0] + list(thresholds)
+        matrix = CategoryMatrix.build(
+            [(a.min_height_cm, a.supervision_height_cm) for a in attractions],
+            range(representatives[0], representatives[-1] + 1),
+        )
+        independent_sets, companion_sets = [], []
+        for height in representatives:
+            independent = companion = 0
+            for i, code in enumerate(matrix.column(height)):
+                if code == INDEPENDENT:
+                    independent |= 1 << i
+                elif code == WITH_COMPANION:
+                    companion |= 1 << i
+            independent_sets.append(independent)
+            companion_sets.append(companion)
+
+        return cls(
+            all_set=(1 << len(attractions)) - 1,
+            flag_sets=flag_sets,
+            thresholds=thresholds,
+            independent_sets=tuple(independent_sets),
+            companion_sets=tuple(companion_sets),
+        )
+
+    def segment(self, height_cm: int) -> int:
+        return bisect_right(self.thresholds, height_cm)
+
+    def select(self, height_cm: Optional[int] = None, require_mask: int = 0,
+               exclude_mask: int = 0, wheelchair: int = 0) -> int:
+        """Bitset of attractions rideable at height_cm (if given) matching the access filters"""
+        selected = self.all_set
+        if height_cm is not None:
+            segment = self.segment(height_cm)
+            selected = self.independent_sets[segment] | self.companion_sets[segment]
+        for bit in _iter_bits(require_mask):
+            selected &= self.flag_sets[1 << bit]
+        for bit in _iter_bits(exclude_mask):
+            selected &= ~self.flag_sets[1 << bit]
+        if wheelchair:
+            accepted = 0
+            for bit in _iter_bits(wheelchair):
+                accepted |= self.flag_sets[1 << bit]
+            selected &= accepted
+        return selected
+
+    def category(self, index: int, height_cm: int) -> str:
+        segment = self.segment(height_cm)
+        if self.independent_sets[segment] >> index & 1:
+            return "independent"
+        if self.companion_sets[segment] >> index & 1:
+            return "with_companion"
+        return "not_available"
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class Snapshot:
+    """One data generation, built once and shared by all routes"""
+    generation: object
+    last_updated: Optional[str]
+    total_attractions: int
+    total_shows: int
+    scrape_stats: Optional[dict]
+    attractions: Tuple[Attraction, ...]
+    shows: Tuple[dict, ...]
+    height_ranges: HeightRanges
+    sources: Tuple[dict, ...]
+    wait_times_info: Optional[dict]
+    upstreams: Dict[str, dict]  # hosts currently failing (breaker.failing_upstreams): data is stale
+    access_index: AccessIndex
+    segment_categories: Tuple[Categories, ...]  # per AccessIndex height segment
+
+    @classmethod
+    def from_dict(cls, data: dict, generation=None) -> "Snapshot":
+        attractions = tuple(Attraction.from_dict(a) for a in data.get("attractions", []))
+        ranges = data.get("height_ranges")
+        if not ranges or any(len(code) != len(attractions) for code in ranges["codes"]):
+            # written before height_ranges existed (or out of step with the attractions)
+            ranges = height_ranges(data.get("attractions", []))
+
+        index = AccessIndex.build(attractions)
+        return cls(
+            generation=generation,
+            last_updated=data.get("last_updated"),
+            total_attractions=data.get("total_attractions", 0),
+            total_shows=data.get("total_shows", 0),
+            scrape_stats=data.get("scrape_stats"),
+            attractions=attractions,
+            shows=tuple(data.get("shows", [])),
+            height_ranges=HeightRanges.from_dict(ranges, attractions),
+            sources=tuple(data.get("sources", [])),
+            wait_times_info=data.get("wait_times_info"),
+            upstreams=data.get("upstreams") or {},
+            access_index=index,
+            segment_categories=tuple(
+                Categories(*(
+                    tuple(attractions[i] for i in _iter_bits(bits))
+                    for bits in (independent, companion, index.all_set & ~(independent | companion))
+                ))
+                for independent, companion in zip(index.independent_sets, index.companion_sets)
+            ),
+        )
+
+    @property
+    def has_wait_times(self) -> bool:
+        return self.wait_times_info is not None
+
+    @property
+    def height_categories(self) -> Dict[str, Categories]:
+        """The fixed buckets of the full page (and of height_categories in /api/data)"""
+        return {str(h): self.height_ranges.lookup(h) for h in HEIGHTS}
+
+    def query(self, height_cm: Optional[int] = None, require_mask: int = 0,
+              exclude_mask: int = 0, wheelchair: int = 0) -> List[Tuple[Attraction, Optional[str]]]:
+        """Attractions matching the filters, with their category when a height is given"""
+        index = self.access_index
+        selected = index.select(height_cm, require_mask, exclude_mask, wheelchair)
+        return [
+            (self.attractions[i], index.category(i, height_cm) if height_cm is not None else None)
+            for i in _iter_bits(selected)
+        ]
+
+    def family(self, heights: Iterable[int]) -> dict:
+        """
+        Categories for several children at once plus the rides everyone can do together,
+        each with the heights that need a companion there. One bisect per child, then bit operations.
+        """
+        index = self.access_index
+        heights = list(heights)
+        segments = [index.segment(h) for h in heights]
+
+        together = index.all_set
+        for segment in segments:
+            together &= index.independent_sets[segment] | index.companion_sets[segment]
+        needs_companion = {}
+        for height, segment in zip(heights, segments):
+            for i in _iter_bits(index.companion_sets[segment] & together):
+                needs_companion.setdefault(i, []).append(height)
+
+        rides = [(self.attractions[i], needs_companion.get(i, [])) for i in _iter_bits(together)]
+        return {
+            "children": [(h, self.segment_categories[segment]) for h, segment in zip(heights, segments)],
+            "together": rides,
+        }
+
+    def to_dict(self) -> dict:
+        """
+        Rebuild the full attractions document; height_categories is derived from the
+        ranges for clients written before height_ranges existed
+        """
+        data = {
+            "last_updated": self.last_updated,
+            "total_attractions": self.total_attractions,
+            "total_shows": self.total_shows,
+            "scrape_stats": self.scrape_stats,
+            "attractions": [a.to_dict(self.has_wait_times) for a in self.attractions],
+            "shows": list(self.shows),
+            "height_categories": {
+                height: categories.to_dict(self.has_wait_times)
+                for height, categories in self.height_categories.items()
+            },
+            "height_ranges": self.height_ranges.to_dict(),
+            "sources": list(self.sources),
+        }
+        if self.has_wait_times:
+            data["wait_times_info"] = self.wait_times_info
+        data["upstreams"] = self.upstreams
+        return data
+
+
+# Top-level document keys tracked by the change log besides the attractions themselves
+META_FIELDS = (
+    "last_updated", "total_attractions", "total_shows", "scrape_stats", "shows", "sources", "wait_times_info",
+    "upstreams",
+)
+
+
+def _change_key(attr: Attraction) -> str:
+    """Key of an attraction in the change log: its slug, which survives renames"""
+    return attr.slug or attr.name
+
+
+def diff_snapshots(old: Snapshot, new: Snapshot) -> dict:
+    """
+    Field level difference between two snapshots, empty if nothing changed:
+    {"attractions": {slug: {field: value} | full dict if added | None if removed},
+     "meta": {key: value}} where meta may include "height_ranges".
+    """
+    with_wait_times = old.has_wait_times or new.has_wait_times
+    old_attractions = {_change_key(a): a.to_dict(with_wait_times) for a in old.attractions}
+    attractions = {}
+    for attr in new.attractions:
+        key = _change_key(attr)
+        current = attr.to_dict(with_wait_times)
+        previous = old_attractions.pop(key, None)
+        if previous is None:
+            attractions[key] = current
+        else:
+            fields = {k: v for k, v in current.items() if previous.get(k) != v}
+            if fields:
+                attractions[key] = fields
+    for key in old_attractions:
+        attractions[key] = None
+
+    old_doc, new_doc = old.to_dict(), new.to_dict()
+    meta = {key: new_doc.get(key) for key in META_FIELDS if old_doc.get(key) != new_doc.get(key)}
+    if old.height_ranges.to_dict() != new.height_ranges.to_dict():
+        meta["height_ranges"] = new.height_ranges.to_dict()
+
+    changes = {}
+    if attractions:
+        changes["attractions"] = attractions
+    if meta:
+        changes["meta"] = meta
+    return changes
+
+
+def merge_changes(change_sets: Iterable[dict]) -> dict:
+    """Fold consecutive change sets into one, later values winning"""
+    attractions, meta = {}, {}
+    for changes in change_sets:
+        for key, fields in changes.get("attractions", {}).items():
+            if fields is None or attractions.get(key, {}) is None:
+                # removed, or re-added after a removal (then fields is the full dict)
+                attractions[key] = None if fields is None else dict(fields)
+            else:
+                attractions.setdefault(key, {}).update(fields)
+        meta.update(changes.get("meta", {}))
+    return {"attractions": attractions, "meta": meta}
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Efteling Height Rules
+The one place that decides whether a child of a given height can ride an attraction.
+
+Every attraction reduces to two thresholds:
+    independent_from  rides alone from this height
+    companion_from    rides with a companion from this height
+so the category for height h is independent if h >= independent_from, with_companion
+if h >= companion_from, otherwise not_available. Missing heights become sentinels
+(0: from any height, NEVER: no companion band), which removes all None branching
+and lets a whole height range be categorized with slice operations.
+"""
+
+from array import array
+from itertools import compress
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+CATEGORIES = ("independent", "with_companion", "not_available")
+INDEPENDENT, WITH_COMPANION, NOT_AVAILABLE = range(3)
+
+# Buckets of the full page and the legacy height_categories in /api/data
+HEIGHTS = [95, 100, 110, 120, 130, 135, 140]
+
+# Range covered by the dense category matrix and the stored height_ranges
+MIN_HEIGHT = 80
+MAX_HEIGHT = 200
+
+# companion_from of attractions that have a minimum but no companion band
+NEVER = 0x7FFF
+
+
+def category_for_height(min_h: Optional[int], supervision_h: Optional[int], height_cm: int) -> str:
+    """
+    Category of one attraction for one height, spelled out case by case:
+    - no min_height and no supervision_height: independent
+    - no min_height: independent from supervision_height, with companion below
+    - min_height: independent from min_height, with companion from supervision_height (if any),
+      otherwise not available
+    This is the reference the threshold arrays are checked against (test_rules.py).
+    """
+    if min_h is None:
+        if supervision_h is None or height_cm >= supervision_h:
+            return "independent"
+        return "with_companion"
+    if height_cm >= min_h:
+        return "independent"
+    if supervision_h is not None and height_cm >= supervision_h:
+        return "with_companion"
+    return "not_available"
+
+
+def thresholds(pairs: Iterable[Tuple[Optional[int], Optional[int]]]) -> Tuple[array, array]:
+    """(min_height_cm, supervision_height_cm) pairs -> independent_from, companion_from arrays"""
+    independent_from, companion_from = array('h'), array('h')
+    for min_h, supervision_h in pairs:
+        if min_h is None:
+            independent_from.append(supervision_h or 0)
+            companion_from.append(0)
+        else:
+            independent_from.append(min_h)
+            companion_from.append(NEVER if supervision_h is None else supervision_h)
+    return independent_from, companion_from
+
+
+def height_pairs(attractions: Iterable[dict]) -> List[Tuple[Optional[int], Optional[int]]]:
+    """Threshold input for attraction dicts"""
+    return [(a.get("min_height_cm"), a.get("supervision_height_cm")) for a in attractions]
+
+
+class CategoryMatrix:
+    """
+    Category codes for heights x attractions, stored attraction-major in one bytes object:
+    row i holds attraction i for every height, built from three repeated runs per row.
+    """
+
+    def __init__(self, independent_from: Sequence[int], companion_from: Sequence[int], heights: range):
+        self.heights = heights
+        self.width = len(heights)
+        first, width = heights.start, self.width
+        runs = [bytes((code,)) * width for code in (NOT_AVAILABLE, WITH_COMPANION, INDEPENDENT)]
+        # Parks have a handful of distinct threshold pairs, so most rows are shared
+        distinct = {}
+        rows = []
+        for pair in zip(independent_from, companion_from):
+            row = distinct.get(pair)
+            if row is None:
+                # heights are consecutive, so each category is one run: clip the cut points into the row
+                ind = min(max(pair[0] - first, 0), width)
+                comp = min(max(pair[1] - first, 0), ind)
+                row = distinct[pair] = runs[0][:comp] + runs[1][:ind - comp] + runs[2][:width - ind]
+            rows.append(row)
+        self.codes = b"".join(rows)
+        self.count = len(rows)
+
+    @classmethod
+    def build(cls, pairs, heights: range = range(MIN_HEIGHT, MAX_HEIGHT + 1)) -> "CategoryMatrix":
+        return cls(*thresholds(pairs), heights)
+
+    def column(self, height_cm: int) -> bytes:
+        """Category code of every attraction for one height"""
+        return self.codes[self.heights.index(height_cm)::self.width]
+
+    def row(self, index: int) -> bytes:
+        """Category code of one attraction for every height"""
+        return self.codes[index * self.width:(index + 1) * self.width]
+
+
+# Category code -> digit in the height_ranges code strings
+_DIGITS = bytes.maketrans(bytes(range(len(CATEGORIES))), "".join(map(str, range(len(CATEGORIES)))).encode())
+
+
+def height_ranges(attractions: list, heights: range = range(MIN_HEIGHT, MAX_HEIGHT + 1)) -> dict:
+    """
+    The dense heights x attractions table run-length encoded over heights. Categories only
+    change at a threshold, so a park needs about a dozen ranges instead of one list per cm:
+        breakpoints  first height of each range, ascending (the first is min_height)
+        codes        per range one digit per attraction, in document order:
+                     0 independent, 1 with_companion, 2 not_available
+    A range runs up to the next breakpoint (the last one up to max_height).
+    """
+    matrix = CategoryMatrix.build(height_pairs(attractions), heights)
+    breakpoints, codes = [], []
+    previous = None
+    for h in heights:
+        column = matrix.column(h)
+        if column != previous:
+            breakpoints.append(h)
+            codes.append(column.translate(_DIGITS).decode())
+            previous = column
+    return {"min_height": heights.start, "max_height": heights.stop - 1, "breakpoints": breakpoints, "codes": codes}
+
+
+# bytes.translate tables turning a column into a 1/0 selector per category
+_SELECTORS = [bytes(int(code == category) for code in range(256)) for category in range(len(CATEGORIES))]
+
+
+def categorize(items: Sequence, codes: bytes) -> dict:
+    """Split items into category lists by one matrix column"""
+    return {
+        category: list(compress(items, codes.translate(selector)))
+        for category, selector in zip(CATEGORIES, _SELECTORS)
+    }
+
+
+def categorize_heights(attractions: list, heights: Iterable[int] = HEIGHTS) -> dict:
+    """{str(height): {category: [attraction dicts]}} for several heights in one matrix build"""
+    heights = sorted(set(heights))
+    matrix = CategoryMatrix.build(height_pairs(attractions), range(heights[0], heights[-1] + 1))
+    return {str(h): categorize(attractions, matrix.column(h)) for h in heights}
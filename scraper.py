@@ -4,21 +4,32 @@ Efteling Height Requirements Scraper
 Collects attraction height and age data dynamically from multiple sources
 """
 
-import json
+import os
 import re
+import sys
 import logging
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, List
-import requests
-from bs4 import BeautifulSoup
+from typing import Dict, List, Optional, Tuple
 import time
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from breaker import CONNECT_TIMEOUT, CircuitBreaker, is_outage
+from leader import is_leader
+from rules import height_ranges
+from storage import get_storage, publish_snapshot
+
+# requests and bs4 are imported where they are used: they dominate import time,
+# and importing this module for its data (app, benchmark) should not pay for them
 logger = logging.getLogger(__name__)
 
-DATA_DIR = Path("/app/data")
-DATA_FILE = DATA_DIR / "attractions.json"
+DATA_DIR = Path(os.environ.get("DATA_DIR", "/app/data"))
+
+# Scrape pipeline (scrape_all_attractions): fetch threads, parse processes, per page timeout
+FETCH_WORKERS = int(os.environ.get("SCRAPE_FETCH_WORKERS", "4"))
+PARSE_WORKERS = int(os.environ.get("SCRAPE_PARSE_WORKERS", str(os.cpu_count() or 1)))
+PAGE_TIMEOUT = float(os.environ.get("SCRAPE_PAGE_TIMEOUT", "30"))
+PARSE_POLL = 0.5  # seconds between looks for newly started parses
+FETCH_DELAY = 0.3  # per fetch thread, between requests
 
 EFTELING_BASE_URL = "https://www.efteling.com/en/park/attractions"
 EFTELING_SHOWS_URL = "https://www.efteling.com/en/park/shows"
@@ -418,6 +429,8 @@ ATTRACTION_NOTES = {
 
 def get_session():
     """Create a requests session with appropriate headers"""
+    import requests
+
     session = requests.Session()
     session.headers.update({
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
@@ -429,15 +442,27 @@ def get_session():
 
 def fetch_page(url: str, session=None, timeout: int = 30) -> Optional[str]:
     """Fetch a webpage and return its HTML content"""
+    return fetch_with_stats(url, session, timeout)[0]
+
+
+def fetch_with_stats(url: str, session=None, timeout: float = 30) -> Tuple[Optional[str], dict]:
+    """Fetch a webpage; also returns http_status, bytes, fetch_ms and error for the page record"""
     if session is None:
         session = get_session()
+    stats = {"http_status": None, "bytes": None, "fetch_ms": None, "error": None}
+    start = time.perf_counter()
+    html = None
     try:
-        response = session.get(url, timeout=timeout)
+        response = session.get(url, timeout=(CONNECT_TIMEOUT, timeout))
+        stats["http_status"] = response.status_code
+        stats["bytes"] = len(response.content)
         response.raise_for_status()
-        return response.text
+        html = response.text
     except Exception as e:
         logger.error(f"Failed to fetch {url}: {e}")
-        return None
+        stats["error"] = str(e)
+    stats["fetch_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return html, stats
 
 
 def parse_height_from_text(text: str) -> Optional[int]:
@@ -460,12 +485,9 @@ def parse_height_from_text(text: str) -> Optional[int]:
     return None
 
 
-def scrape_efteling_attraction(slug: str, base_info: dict, session) -> dict:
-    """Scrape details from a single Efteling attraction page"""
-    url = f"{EFTELING_BASE_URL}/{slug}"
-    logger.info(f"Scraping {base_info['name']} from {url}")
-    
-    result = {
+def new_attraction(slug: str, base_info: dict) -> dict:
+    """Attraction record before scraping, in the schema of the attractions document"""
+    return {
         "name": base_info["name"],
         "name_dutch": base_info.get("name_dutch"),
         "type": base_info["type"],
@@ -476,15 +498,45 @@ def scrape_efteling_attraction(slug: str, base_info: dict, session) -> dict:
         "advisory_age": None,  # Recommended minimum age
         "notes": "",
         "access": {},  # Access conditions (wheelchair, pregnant, etc.)
-        "url": url,
+        "url": f"{EFTELING_BASE_URL}/{slug}",
+        "slug": slug,  # stable ID, wait times are joined on it
         "category": "attraction",
         "scrape_status": "pending"
     }
-    
-    html = fetch_page(url, session)
-    if not html:
-        result["scrape_status"] = "failed"
-        return result
+
+
+def new_page_record(name: str) -> dict:
+    """Diagnostics of one scraped page, stored per run (see storage.SCRAPE_PAGE_FIELDS)"""
+    return {
+        "name": name,
+        "status": "pending",  # success, failed (fetch) or error (parse)
+        "http_status": None,
+        "bytes": None,
+        "fetch_ms": None,
+        "parse_ms": None,
+        "rules": [],  # parse rules that matched, see parse_attraction_page
+        "fallback_fields": [],  # fields filled in by apply_fallback_data
+        "error": None,
+    }
+
+
+def parse_attraction_page(html: str, matched: Optional[List[str]] = None) -> dict:
+    """
+    Extract heights, ages and access conditions from an attraction page.
+    Pure and top level so it can run in a worker process (see scrape_all_attractions).
+    The rules that matched are appended to matched, e.g. "min_height[0]" for the first
+    minimum height pattern, "access:dark" for an access condition.
+    """
+    from bs4 import BeautifulSoup
+
+    if matched is None:
+        matched = []
+    result = {
+        "min_height_cm": None,
+        "supervision_height_cm": None,
+        "companion_age": None,
+        "advisory_age": None,
+    }
     
     soup = BeautifulSoup(html, 'html.parser')
     page_text = soup.get_text().lower()
@@ -496,12 +548,13 @@ def scrape_efteling_attraction(slug: str, base_info: dict, session) -> dict:
         r'minimum\s+length\s+(\d+\.?\d*)\s*m',
     ]
     
-    for pattern in min_patterns:
+    for i, pattern in enumerate(min_patterns):
         match = re.search(pattern, page_text)
         if match:
             height = parse_height_from_text(match.group(0))
             if height:
                 result["min_height_cm"] = height
+                matched.append(f"min_height[{i}]")
                 break
     
     # Pattern 2: Supervision/companion requirement "Children < X m under supervision" or "with company"
@@ -511,7 +564,7 @@ def scrape_efteling_attraction(slug: str, base_info: dict, session) -> dict:
         r'kinderen\s*<\s*(\d+\.?\d*)\s*m\s+(?:onder\s+begeleiding|met\s+begeleiding)',
     ]
     
-    for pattern in supervision_patterns:
+    for i, pattern in enumerate(supervision_patterns):
         match = re.search(pattern, page_text)
         if match:
             height = float(match.group(1))
@@ -524,6 +577,7 @@ def scrape_efteling_attraction(slug: str, base_info: dict, session) -> dict:
                 result["companion_age"] = int(match.group(2))
             elif 'company' in match.group(0) or 'companion' in match.group(0):
                 result["companion_age"] = 16  # Default companion age
+            matched.append(f"supervision[{i}]")
             break
     
     # Pattern 3: Between X and Y with companion (for rides like Joris en de Draak)
@@ -532,7 +586,7 @@ def scrape_efteling_attraction(slug: str, base_info: dict, session) -> dict:
         r'between\s+(\d+\.?\d*)\s*m?\s+and\s+(\d+\.?\d*)\s*m?\s+with',
     ]
     
-    for pattern in between_patterns:
+    for i, pattern in enumerate(between_patterns):
         match = re.search(pattern, page_text)
         if match:
             lower = float(match.group(1))
@@ -544,6 +598,7 @@ def scrape_efteling_attraction(slug: str, base_info: dict, session) -> dict:
             result["supervision_height_cm"] = int(lower)
             result["min_height_cm"] = int(upper)
             result["companion_age"] = 16
+            matched.append(f"between[{i}]")
             break
     
     # Extract advisory age
@@ -553,10 +608,11 @@ def scrape_efteling_attraction(slug: str, base_info: dict, session) -> dict:
         r'recommended.*?(\d+)\s*(?:years?|jaar)',
     ]
     
-    for pattern in age_patterns:
+    for i, pattern in enumerate(age_patterns):
         match = re.search(pattern, page_text)
         if match:
             result["advisory_age"] = int(match.group(1))
+            matched.append(f"advisory_age[{i}]")
             break
     
     # Extract access conditions
@@ -608,38 +664,215 @@ def scrape_efteling_attraction(slug: str, base_info: dict, session) -> dict:
         access['surprising'] = True
     
     result["access"] = access
-    result["scrape_status"] = "success"
-    
+    matched.extend(f"access:{key}" for key in access)
     return result
 
 
-def scrape_all_attractions(session) -> List[dict]:
-    """Scrape all Efteling attractions"""
-    attractions = []
+def parse_page(html: str) -> Tuple[dict, List[str], float]:
+    """Worker entry point: parsed fields, matched rules and parse time in ms"""
+    start = time.perf_counter()
+    matched = []
+    result = parse_attraction_page(html, matched)
+    return result, matched, round((time.perf_counter() - start) * 1000, 1)
+
+
+# Queue of the scrape run this parse worker serves, set when the worker starts
+_parse_started = None
+
+
+def _init_parse_worker(started) -> None:
+    global _parse_started
+    _parse_started = started
+
+
+def _parse_task(task: int, html: str) -> Tuple[dict, List[str], float]:
+    """parse_page() in a pool worker, announcing (task, pid, start) so the run can time the parse itself"""
+    _parse_started.put((task, os.getpid(), time.time()))
+    return parse_page(html)
+
+
+def scrape_efteling_attraction(slug: str, base_info: dict, session, record: Optional[dict] = None) -> dict:
+    """Scrape details from a single Efteling attraction page (diagnostics go into record)"""
+    result = new_attraction(slug, base_info)
+    if record is None:
+        record = new_page_record(result["name"])
+    logger.info(f"Scraping {base_info['name']} from {result['url']}")
     
-    for slug, base_info in ATTRACTION_SLUGS.items():
+    html, stats = fetch_with_stats(result["url"], session)
+    record.update(stats)
+    if not html:
+        result["scrape_status"] = record["status"] = "failed"
+        return result
+    
+    fields, record["rules"], record["parse_ms"] = parse_page(html)
+    result.update(fields)
+    result["scrape_status"] = record["status"] = "success"
+    
+    return result
+
+
+def scrape_all_attractions(session, fetch_workers: int = FETCH_WORKERS, parse_workers: int = PARSE_WORKERS,
+                           page_timeout: float = PAGE_TIMEOUT, slugs: Optional[dict] = None,
+                           records: Optional[List[dict]] = None, breaker: Optional[CircuitBreaker] = None) -> List[dict]:
+    """
+    Scrape all Efteling attractions in two stages: pages are fetched on threads (I/O bound)
+    into a bounded queue, and parsed in a process pool (CPU bound, one GIL per core).
+    A full queue blocks the fetchers, and at most two parses per worker are in flight, so
+    memory stays bounded however many pages there are. A page whose parse does not finish
+    within page_timeout of starting counts as an error; its worker is killed and the pool
+    replaced, as a running parse cannot be cancelled. Output is in slugs order (default ATTRACTION_SLUGS),
+    and so are the page records appended to records. Once breaker opens, the remaining
+    pages are not fetched at all.
+    """
+    import multiprocessing
+    import queue
+    import signal
+    import threading
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+    pages = list((slugs or ATTRACTION_SLUGS).items())
+    attractions = [new_attraction(slug, base_info) for slug, base_info in pages]
+    page_records = [new_page_record(attr["name"]) for attr in attractions]
+    fetched = queue.Queue(maxsize=2 * parse_workers)
+    stop = threading.Event()
+
+    def fetch(index):
+        attr = attractions[index]
+        html = None
         try:
-            attraction = scrape_efteling_attraction(slug, base_info, session)
-            attractions.append(attraction)
-            time.sleep(0.3)
+            if breaker is not None and not breaker.allow():
+                page_records[index]["error"] = f"skipped, circuit for {breaker.host} is open"
+            elif not stop.is_set():
+                logger.info(f"Fetching {attr['name']} from {attr['url']}")
+                html, stats = fetch_with_stats(attr["url"], session, timeout=page_timeout)
+                page_records[index].update(stats)
+                if breaker is not None:
+                    if is_outage(stats["http_status"]):
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
         except Exception as e:
-            logger.error(f"Error scraping {slug}: {e}")
-            attractions.append({
-                "name": base_info["name"],
-                "name_dutch": base_info.get("name_dutch"),
-                "type": base_info["type"],
-                "type_dutch": base_info.get("type_dutch"),
-                "min_height_cm": None,
-                "min_height_with_companion_cm": None,
-                "companion_age": None,
-                "advisory_age": None,
-                "notes": "",
-                "warnings": [],
-                "url": f"{EFTELING_BASE_URL}/{slug}",
-                "category": "attraction",
-                "scrape_status": "error"
-            })
-    
+            logger.error(f"Error fetching {attr['name']}: {e}")
+            page_records[index]["error"] = str(e)
+        # Every page is queued exactly once, so the parse stage knows when it has seen them all
+        while not stop.is_set():
+            try:
+                fetched.put((index, html), timeout=1)
+                break
+            except queue.Full:
+                continue
+        time.sleep(FETCH_DELAY)  # stay polite per connection
+
+    # spawn: forking a process that already runs fetch threads can deadlock
+    context = multiprocessing.get_context("spawn")
+    started = context.Queue()  # (task, worker pid, start time) from _parse_task
+
+    def new_parsers():
+        return ProcessPoolExecutor(parse_workers, mp_context=context,
+                                   initializer=_init_parse_worker, initargs=(started,))
+
+    parsers = new_parsers()
+    fetchers = ThreadPoolExecutor(fetch_workers, thread_name_prefix="fetch")
+    in_flight = {}  # parse future -> (task, page index, html)
+    running = {}  # task -> (worker pid, deadline), once its parse started
+    tasks = iter(range(sys.maxsize))
+
+    def set_status(index, status, error=None):
+        attractions[index]["scrape_status"] = page_records[index]["status"] = status
+        if error is not None:
+            logger.error(f"Error parsing {attractions[index]['name']}: {error}")
+            page_records[index]["error"] = error
+
+    def submit(index, html):
+        task = next(tasks)
+        in_flight[parsers.submit(_parse_task, task, html)] = (task, index, html)
+
+    def collect(futures):
+        for future in futures:
+            task, index, _ = in_flight.pop(future)
+            running.pop(task, None)
+            try:
+                fields, rules, parse_ms = future.result()
+            except Exception as e:
+                set_status(index, "error", str(e))
+                continue
+            attractions[index].update(fields)
+            page_records[index].update(rules=rules, parse_ms=parse_ms)
+            set_status(index, "success")
+
+    def note_started():
+        live = {task for task, _, _ in in_flight.values()}
+        while True:
+            try:
+                task, pid, start = started.get_nowait()
+            except queue.Empty:
+                return
+            if task in live:  # not a leftover of a pool that was replaced
+                running[task] = (pid, start + page_timeout)
+
+    def kill(pids):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def expire():
+        nonlocal parsers
+        now = time.time()
+        if not any(now >= deadline for _, deadline in running.values()):
+            return
+        collect([future for future in in_flight if future.done()])
+        expired = [(future, task) for future, (task, _, _) in in_flight.items()
+                   if task in running and now >= running[task][1]]
+        for future, task in expired:
+            _, index, _ = in_flight.pop(future)
+            set_status(index, "error", f"parse timed out after {page_timeout}s")
+        # Killing a worker breaks its pool: the executor stops the other workers, and the
+        # parses that were still pending or running start over in a fresh pool
+        kill(running.pop(task)[0] for _, task in expired)
+        parsers.shutdown(wait=False, cancel_futures=True)
+        parsers = new_parsers()
+        retry = list(in_flight.values())
+        in_flight.clear()
+        running.clear()
+        for _, index, html in retry:
+            submit(index, html)
+
+    def drain(limit):
+        while len(in_flight) > limit:
+            note_started()
+            deadlines = [deadline for _, deadline in running.values()]
+            # Starts are only seen between waits, so look again at least every PARSE_POLL seconds
+            timeout = min([PARSE_POLL] + [max(0.0, deadline - time.time()) for deadline in deadlines])
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            collect(done)
+            note_started()
+            expire()
+
+    try:
+        for i in range(len(pages)):
+            fetchers.submit(fetch, i)
+        for _ in pages:
+            drain(2 * parse_workers - 1)
+            index, html = fetched.get()
+            if not html:
+                set_status(index, "failed")
+                continue
+            try:
+                submit(index, html)
+            except Exception as e:  # broken pool: the fallback data covers the page
+                set_status(index, "error", str(e))
+        drain(0)
+    finally:
+        stop.set()
+        fetchers.shutdown(wait=True, cancel_futures=True)
+        # Left running only if the run failed; a parse stuck in a worker must not hold up the exit
+        kill(pid for pid, _ in running.values())
+        parsers.shutdown(wait=False, cancel_futures=True)
+
+    if records is not None:
+        records.extend(page_records)
     return attractions
 
 
@@ -658,27 +891,29 @@ def get_shows() -> List[dict]:
     ]
 
 
-def apply_fallback_data(attractions: List[dict]) -> List[dict]:
-    """Apply fallback height data where scraping failed"""
+def apply_fallback_data(attractions: List[dict], applied: Optional[Dict[str, List[str]]] = None) -> List[dict]:
+    """Apply fallback height data where scraping failed; applied collects the filled fields per name"""
     for attr in attractions:
         name = attr["name"]
+        filled = []
         
         if name in FALLBACK_HEIGHT_DATA:
             fallback = FALLBACK_HEIGHT_DATA[name]
-            if attr.get("min_height_cm") is None:
-                attr["min_height_cm"] = fallback.get("min_height_cm")
-            if attr.get("supervision_height_cm") is None:
-                attr["supervision_height_cm"] = fallback.get("supervision_height_cm")
-            if attr.get("companion_age") is None:
-                attr["companion_age"] = fallback.get("companion_age")
-            if attr.get("advisory_age") is None:
-                attr["advisory_age"] = fallback.get("advisory_age")
+            for field in ("min_height_cm", "supervision_height_cm", "companion_age", "advisory_age"):
+                if attr.get(field) is None and fallback.get(field) is not None:
+                    attr[field] = fallback[field]
+                    filled.append(field)
             # Apply access conditions
             if "access" in fallback and not attr.get("access"):
                 attr["access"] = fallback["access"]
+                filled.append("access")
         
         if name in ATTRACTION_NOTES and not attr.get("notes"):
             attr["notes"] = ATTRACTION_NOTES[name]
+            filled.append("notes")
+        
+        if applied is not None and filled:
+            applied[name] = filled
         
         # Ensure access dict exists
         if "access" not in attr:
@@ -687,75 +922,18 @@ def apply_fallback_data(attractions: List[dict]) -> List[dict]:
     return attractions
 
 
-def categorize_by_height(attractions: list, height_cm: int) -> dict:
-    """
-    Categorize attractions by availability for a given height.
-    
-    Logic:
-    - If no min_height AND no supervision_height: Can ride independently (no restrictions)
-    - If no min_height AND height >= supervision_height: Can ride independently
-    - If no min_height AND height < supervision_height: Needs supervision/companion
-    - If min_height AND height >= min_height: Can ride independently
-    - If min_height AND supervision_height AND height >= supervision_height: Needs companion
-    - If min_height AND height < min_height (and < supervision if exists): Cannot ride
-    """
-    result = {'independent': [], 'with_companion': [], 'not_available': []}
-    
-    for attr in attractions:
-        min_h = attr.get("min_height_cm")
-        supervision_h = attr.get("supervision_height_cm")
-        
-        # Case 1: No restrictions at all
-        if min_h is None and supervision_h is None:
-            result['independent'].append(attr)
-        
-        # Case 2: Only supervision requirement (no hard minimum)
-        elif min_h is None and supervision_h is not None:
-            if height_cm >= supervision_h:
-                result['independent'].append(attr)
-            else:
-                result['with_companion'].append(attr)
-        
-        # Case 3: Hard minimum exists
-        elif min_h is not None:
-            if height_cm >= min_h:
-                result['independent'].append(attr)
-            elif supervision_h is not None and height_cm >= supervision_h:
-                result['with_companion'].append(attr)
-            else:
-                result['not_available'].append(attr)
-    
-    return result
-
-
-def run_scraper():
-    """Main scraper function"""
-    logger.info("Starting Efteling height requirements scraper")
-    
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    
-    session = get_session()
-    
-    logger.info("Scraping attraction pages...")
-    attractions = scrape_all_attractions(session)
-    attractions = apply_fallback_data(attractions)
-    shows = get_shows()
-    
+def build_document(attractions: List[dict], shows: List[dict], source_status: Optional[str] = None) -> dict:
+    """Assemble the attractions document (source_status overrides the scrape based status)"""
     attractions = sorted(attractions, key=lambda x: (x.get("min_height_cm") or 0, x["name"]))
     
     success_count = sum(1 for a in attractions if a.get("scrape_status") == "success")
     failed_count = len(attractions) - success_count
     
-    height_categories = {
-        str(h): categorize_by_height(attractions, h) 
-        for h in [95, 100, 110, 120, 130, 135, 140]
-    }
-    
     sources = [
         {
             "name": "Efteling Official (Attractions)",
             "url": EFTELING_BASE_URL,
-            "status": "success" if success_count > 0 else "failed",
+            "status": source_status or ("success" if success_count > 0 else "failed"),
             "attractions_scraped": success_count,
             "attractions_failed": failed_count,
             "fetched_at": datetime.now().isoformat()
@@ -778,19 +956,128 @@ def run_scraper():
         },
         "attractions": attractions,
         "shows": shows,
-        "height_categories": height_categories,
+        "height_ranges": height_ranges(attractions),
         "sources": sources
     }
     
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    return data
+
+
+def bootstrap_data() -> dict:
+    """
+    Complete document from the embedded FALLBACK_HEIGHT_DATA / ATTRACTION_NOTES, without any
+    network access. Served on a fresh volume until the first live scrape replaces it.
+    """
+    attractions = [
+        {
+            "name": info["name"],
+            "name_dutch": info.get("name_dutch"),
+            "type": info["type"],
+            "type_dutch": info.get("type_dutch"),
+            "min_height_cm": None,
+            "supervision_height_cm": None,
+            "companion_age": None,
+            "advisory_age": None,
+            "notes": "",
+            "access": {},
+            "url": f"{EFTELING_BASE_URL}/{slug}",
+            "slug": slug,
+            "category": "attraction",
+            "scrape_status": "embedded",
+        }
+        for slug, info in ATTRACTION_SLUGS.items()
+    ]
+    return build_document(apply_fallback_data(attractions), get_shows(), source_status="embedded")
+
+
+def run_bootstrap() -> bool:
+    """Store and publish the embedded data if the volume has none yet; True if it did"""
+    storage = get_storage()
+    if storage.generation() is not None:
+        logger.info("Data already present, skipping bootstrap")
+        return False
+    storage.save_data(bootstrap_data())
+    # Local only: a replica joining late must not replace the leader's live data for everyone
+    publish_snapshot(share=False)
+    logger.info("Published bootstrap data from the embedded fallback tables")
+    return True
+
+
+def probe_upstream(breaker: CircuitBreaker, session) -> bool:
+    """
+    Whether to scrape: always while the breaker is closed, never while it is open. After
+    the cool-down one request for the attractions overview decides.
+    """
+    state = breaker.state
+    if state == "open":
+        logger.warning(f"Circuit for {breaker.host} is open until {breaker.retry_at():%H:%M:%S} UTC, skipping the scrape")
+        return False
+    if state == "half_open":
+        logger.info(f"Probing {breaker.host} after the cool-down")
+        _, stats = fetch_with_stats(EFTELING_BASE_URL, session, timeout=PAGE_TIMEOUT)
+        if is_outage(stats["http_status"]):
+            breaker.record_failure()
+            return False
+        breaker.record_success()
+    return True
+
+
+def probe() -> bool:
+    """Probe Efteling.com if its breaker is half open (leader.probe_upstreams); True if that closed it"""
+    breaker = CircuitBreaker.for_url(EFTELING_BASE_URL)
+    return breaker.state == "half_open" and probe_upstream(breaker, get_session())
+
+
+def run_scraper():
+    """Main scraper function"""
+    logger.info("Starting Efteling height requirements scraper")
+    if not is_leader():
+        logger.info("Another replica is the leader, skipping the scrape")
+        return None
+    
+    session = get_session()
+    storage = get_storage()
+    breaker = CircuitBreaker.for_url(EFTELING_BASE_URL)
+    
+    if not probe_upstream(breaker, session):
+        # Keep serving the last good data; the published snapshot marks it stale
+        publish_snapshot(storage)
+        return None
+    
+    logger.info("Scraping attraction pages...")
+    started_at = datetime.now().isoformat()
+    start = time.perf_counter()
+    records, fallback_fields = [], {}
+    attractions = scrape_all_attractions(session, records=records, breaker=breaker)
+    attractions = apply_fallback_data(attractions, fallback_fields)
+    for record in records:
+        record["fallback_fields"] = fallback_fields.get(record["name"], [])
+    storage.record_scrape_run({
+        "started_at": started_at,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        "pages": records,
+    })
+    
+    if breaker.state != "closed" and storage.generation() is not None:
+        logger.warning(f"{breaker.host} became unreachable during the scrape, keeping the last data")
+        publish_snapshot(storage)
+        return None
+    
+    data = build_document(attractions, get_shows())
+    storage.save_data(data)
+    publish_snapshot(storage)
     
-    logger.info(f"Scraper complete. Data saved to {DATA_FILE}")
-    logger.info(f"Attractions: {len(attractions)} ({success_count} scraped, {failed_count} fallback)")
-    logger.info(f"Shows: {len(shows)}")
+    logger.info(f"Scraper complete. Data saved to {DATA_DIR}")
+    stats = data["scrape_stats"]
+    logger.info(f"Attractions: {data['total_attractions']} ({stats['successful']} scraped, {stats['failed']} fallback)")
+    logger.info(f"Shows: {data['total_shows']}")
     
     return data
 
 
 if __name__ == '__main__':
-    run_scraper()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if '--bootstrap' in sys.argv[1:]:
+        run_bootstrap()
+    else:
+        run_scraper()
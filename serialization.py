@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Efteling Data Serialization
+Pluggable codecs and a sectioned binary container for the attractions document.
+
+Container layout (little endian):
+    magic "EFTS" | version u8 | codec name length u8 | codec name
+    section count u16 | per section: name length u8, name, offset u32, length u32
+    section payloads (offsets are relative to the end of the header)
+
+Every top-level key of the document is its own section, so a reader can decode
+e.g. only "height_ranges" without touching "sources" or "attractions". Raw sections
+carry bytes as they are (e.g. prepared response bodies) and are read without decoding.
+"""
+
+import json
+import struct
+from typing import Dict, Iterable, Optional
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the standard library
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional, the container then uses JSON payloads
+    msgpack = None
+
+MAGIC = b"EFTS"
+VERSION = 1
+
+
+class JsonCodec:
+    """Compact JSON (orjson when installed)"""
+    name = "json"
+
+    def encode(self, obj) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(obj)
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode()
+
+    def decode(self, buffer):
+        if orjson is not None:
+            return orjson.loads(buffer)
+        return json.loads(bytes(buffer))
+
+
+class PrettyJsonCodec(JsonCodec):
+    """Indented JSON, the historical attractions.json format (for debugging)"""
+    name = "json-pretty"
+
+    def encode(self, obj) -> bytes:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode()
+
+
+class MsgpackCodec:
+    """MessagePack, requires the msgpack package"""
+    name = "msgpack"
+
+    def encode(self, obj) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def decode(self, buffer):
+        return msgpack.unpackb(buffer, raw=False)
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec(), PrettyJsonCodec())}
+if msgpack is not None:
+    CODECS[MsgpackCodec.name] = MsgpackCodec()
+
+
+def get_codec(name: Optional[str] = None):
+    """Codec by name; default is compact JSON, which with orjson beats msgpack on our documents"""
+    if name is None:
+        name = JsonCodec.name
+    if name not in CODECS:
+        raise ValueError(f"Unknown codec {name!r}, available: {sorted(CODECS)}")
+    return CODECS[name]
+
+
+def dumps_sections(data: dict, codec=None, raw: Optional[Dict[str, bytes]] = None) -> bytes:
+    """Encode a document into the sectioned container, plus raw sections stored as they are"""
+    codec = codec or get_codec()
+    codec_name = codec.name.encode()
+
+    payloads = [(key.encode(), codec.encode(value)) for key, value in data.items()]
+    payloads += [(key.encode(), bytes(value)) for key, value in (raw or {}).items()]
+
+    header = [MAGIC, struct.pack("<BB", VERSION, len(codec_name)), codec_name, struct.pack("<H", len(payloads))]
+    offset = 0
+    for name, payload in payloads:
+        header.append(struct.pack("<B", len(name)) + name + struct.pack("<II", offset, len(payload)))
+        offset += len(payload)
+
+    return b"".join(header + [payload for _, payload in payloads])
+
+
+class SectionReader:
+    """Lazy reader over a sectioned container; sections are decoded on first access"""
+
+    def __init__(self, buffer):
+        view = memoryview(buffer)
+        if bytes(view[:4]) != MAGIC:
+            raise ValueError("Not a sectioned data file")
+        version, name_len = struct.unpack_from("<BB", view, 4)
+        if version != VERSION:
+            raise ValueError(f"Unsupported section format version {version}")
+        pos = 6
+        self.codec = get_codec(bytes(view[pos:pos + name_len]).decode())
+        pos += name_len
+        (count,) = struct.unpack_from("<H", view, pos)
+        pos += 2
+
+        table = []
+        for _ in range(count):
+            (key_len,) = struct.unpack_from("<B", view, pos)
+            key = bytes(view[pos + 1:pos + 1 + key_len]).decode()
+            offset, length = struct.unpack_from("<II", view, pos + 1 + key_len)
+            table.append((key, offset, length))
+            pos += 1 + key_len + 8
+
+        self._sections = {key: view[pos + offset:pos + offset + length] for key, offset, length in table}
+        self._decoded = {}
+
+    def keys(self):
+        return self._sections.keys()
+
+    def __contains__(self, key) -> bool:
+        return key in self._sections
+
+    def raw(self, key: str) -> memoryview:
+        """Undecoded bytes of one section, a view into the buffer"""
+        return self._sections[key]
+
+    def read(self, key: str):
+        """Decode one section"""
+        if key not in self._decoded:
+            self._decoded[key] = self.codec.decode(self._sections[key])
+        return self._decoded[key]
+
+    def load(self, keys: Optional[Iterable[str]] = None) -> dict:
+        """Decode the given sections (default: all) into a document dict"""
+        keys = self.keys() if keys is None else [k for k in keys if k in self._sections]
+        return {key: self.read(key) for key in keys}
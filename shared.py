@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Efteling Shared Cache
+Optional tier shared by all replicas behind a load balancer (SHARED_CACHE_URL):
+    lease     one elected replica runs the scraper and wait time jobs (leader.py)
+    snapshot  the leader stores every published snapshot here and announces its generation
+    pub/sub   the web workers of every replica load it and drop their response caches
+Without SHARED_CACHE_URL each replica works on its own, as before.
+
+    redis://host:6379/0  Redis or anything speaking its protocol, requires the redis package
+    memory://            in-process fake with the same semantics, for tests and benchmarks
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+SHARED_CACHE_URL = os.environ.get("SHARED_CACHE_URL", "")
+
+# Keys and channels of this deployment, so several can share one server
+SHARED_CACHE_PREFIX = os.environ.get("SHARED_CACHE_PREFIX", "efteling:")
+
+# Lease owner name of this replica; container hostnames are unique per replica
+REPLICA_ID = os.environ.get("REPLICA_ID") or f"{socket.gethostname()}"
+
+SNAPSHOT_KEY = "snapshot"
+GENERATION_KEY = "snapshot:generation"
+SNAPSHOT_CHANNEL = "snapshots"
+
+
+class MemoryBackend:
+    """In-process stand-in for Redis: values with expiry, leases and synchronous pub/sub"""
+
+    def __init__(self):
+        self._values = {}  # key -> (value, expires or None)
+        self._subscribers = {}  # channel -> [callback]
+        self._lock = threading.Lock()
+
+    def _live(self, key: str):
+        entry = self._values.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._values[key]
+            entry = None
+        return entry
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._live(key)
+        return None if entry is None else entry[0]
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._values[key] = (value, None if ttl is None else time.monotonic() + ttl)
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Take the lease if it is free or expired, renew it if owner holds it; True if owner holds it now"""
+        with self._lock:
+            entry = self._live(name)
+            if entry is not None and entry[0] != owner.encode():
+                return False
+            self._values[name] = (owner.encode(), time.monotonic() + ttl)
+            return True
+
+    def release_lease(self, name: str, owner: str) -> None:
+        with self._lock:
+            entry = self._live(name)
+            if entry is not None and entry[0] == owner.encode():
+                del self._values[name]
+
+    def lease_owner(self, name: str) -> Optional[str]:
+        value = self.get(name)
+        return None if value is None else value.decode()
+
+    def publish(self, channel: str, message: str) -> None:
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, ()))
+        for callback in callbacks:
+            callback(message)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> Callable[[], None]:
+        """Call callback(message) for every message on channel; returns a function that unsubscribes"""
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(callback)
+        return lambda: self._subscribers[channel].remove(callback)
+
+
+# Set the lease to the owner unless someone else holds it; one round trip, atomic on the server
+_ACQUIRE_LEASE = """
+local owner = redis.call('GET', KEYS[1])
+if owner and owner ~= ARGV[1] then return 0 end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return 1
+"""
+
+_RELEASE_LEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+
+class RedisBackend:
+    """The same operations on a Redis server; every key and channel gets SHARED_CACHE_PREFIX"""
+
+    def __init__(self, url: str, prefix: str = SHARED_CACHE_PREFIX):
+        # Imported here: every job imports this module (through leader.py), most never connect
+        try:
+            import redis
+        except ImportError:
+            raise ValueError(f"SHARED_CACHE_URL {url!r} requires the redis package (pip install redis)")
+        # Short timeouts: a missing cache tier must not hold up page requests
+        self.client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        self.prefix = prefix
+        self._acquire = self.client.register_script(_ACQUIRE_LEASE)
+        self._release = self.client.register_script(_RELEASE_LEASE)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        self.client.set(self.prefix + key, value, px=None if ttl is None else int(ttl * 1000))
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        return bool(self._acquire(keys=[self.prefix + name], args=[owner, int(ttl * 1000)]))
+
+    def release_lease(self, name: str, owner: str) -> None:
+        self._release(keys=[self.prefix + name], args=[owner])
+
+    def lease_owner(self, name: str) -> Optional[str]:
+        value = self.get(name)
+        return None if value is None else value.decode()
+
+    def publish(self, channel: str, message: str) -> None:
+        self.client.publish(self.prefix + channel, message)
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> Callable[[], None]:
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.prefix + channel: lambda message: callback(message["data"].decode())})
+
+        def on_error(error, pubsub, thread):
+            # Keep listening; redis-py reconnects on the next read
+            logger.warning(f"Shared cache subscription failed: {error}")
+            time.sleep(1)
+
+        thread = pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=on_error)
+        return thread.stop
+
+
+_shared = None
+
+
+def get_shared():
+    """Process-wide shared cache backend selected by SHARED_CACHE_URL, None when not configured"""
+    global _shared
+    if _shared is None and SHARED_CACHE_URL:
+        if SHARED_CACHE_URL.startswith("memory://"):
+            _shared = MemoryBackend()
+        elif SHARED_CACHE_URL.startswith(("redis://", "rediss://", "unix://")):
+            _shared = RedisBackend(SHARED_CACHE_URL)
+        else:
+            raise ValueError(f"Unknown SHARED_CACHE_URL {SHARED_CACHE_URL!r}, expected redis:// or memory://")
+        logger.info(f"Using shared cache {SHARED_CACHE_URL.split('@')[-1]} as replica {REPLICA_ID}")
+    return _shared
+
+
+def share_snapshot(shared, snapshot) -> None:
+    """
+    Store a published snapshot for the other replicas and announce its generation.
+    The document travels as JSON, so a replica never unpickles network data.
+    """
+    from storage import encode_snapshot
+
+    shared.set(SNAPSHOT_KEY, encode_snapshot(snapshot))
+    shared.set(GENERATION_KEY, str(snapshot.generation).encode())
+    shared.publish(SNAPSHOT_CHANNEL, str(snapshot.generation))
+
+
+def shared_generation(shared) -> Optional[str]:
+    """Generation of the shared snapshot (cheap, the document itself is not fetched)"""
+    value = shared.get(GENERATION_KEY)
+    return None if value is None else value.decode()
+
+
+def load_shared_snapshot(shared):
+    """The shared snapshot, None if there is none or it was built by a different model version"""
+    from storage import decode_snapshot
+
+    value = shared.get(SNAPSHOT_KEY)
+    return None if value is None else decode_snapshot(value)
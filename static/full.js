@@ -0,0 +1,17 @@
+// Full page: every height is pre-rendered, the buttons only toggle visibility
+function showHeight(button) {
+    document.querySelectorAll('.results').forEach(el => el.classList.remove('active'));
+    document.querySelectorAll('.height-btn').forEach(btn => btn.classList.remove('active'));
+    document.getElementById('results-' + button.dataset.height).classList.add('active');
+    button.classList.add('active');
+}
+
+document.querySelectorAll('.height-btn').forEach(btn => {
+    btn.addEventListener('click', () => showHeight(btn));
+});
+
+document.querySelectorAll('.clickable-row').forEach(row => {
+    row.addEventListener('click', e => {
+        if (!e.target.closest('a')) window.open(row.dataset.url, '_blank');
+    });
+});
@@ -0,0 +1,139 @@
+// Lean page: the attraction list is embedded once as JSON and categorized here for any height
+(function () {
+    var payload = JSON.parse(document.getElementById('attractions-data').textContent);
+    var F = {};
+    payload.fields.forEach(function (field, i) { F[field] = i; });
+
+    function esc(value) {
+        return String(value).replace(/[&<>"']/g, function (c) {
+            return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+        });
+    }
+
+    // Category codes per height range (rules.height_ranges); null outside the ranges
+    var CATS = ['independent', 'with_companion', 'not_available'];
+    function codes(height) {
+        var ranges = payload.ranges, bp = ranges.breakpoints, lo = 0, hi = bp.length - 1;
+        if (!(height >= ranges.min_height && height <= ranges.max_height)) return null;
+        while (lo < hi) {
+            var mid = (lo + hi + 1) >> 1;
+            if (bp[mid] <= height) lo = mid; else hi = mid - 1;
+        }
+        return ranges.codes[lo];
+    }
+
+    function waitHtml(r) {
+        var isOpen = r[F.is_open], wait = r[F.wait_time];
+        if (wait === null && isOpen === null) return '';
+        var cls = isOpen === false ? 'closed' : wait >= 45 ? 'very-busy' : wait >= 20 ? 'busy' : 'open';
+        var text = isOpen === false ? '🔴 Closed' : wait !== null ? '⏱️ ' + wait + ' min' : '🟢 Open';
+        return '<div class="wait-time ' + cls + '">' + text + '</div>';
+    }
+
+    function iconsHtml(mask) {
+        if (!mask) return '';
+        var html = '';
+        payload.icons.forEach(function (icon) {
+            if (mask & icon[0]) html += '<span class="access-icon ' + icon[1] + '" title="' + esc(icon[2]) + '">' + icon[3] + '</span>';
+        });
+        return '<div class="access-icons">' + html + '</div>';
+    }
+
+    function badge(cls, text) { return '<span class="badge ' + cls + '">' + text + '</span>'; }
+
+    function card(r, cat) {
+        var min = r[F.min], sup = r[F.sup], badges = '';
+        if (cat === 'independent') {
+            badges += min ? badge('badge-height', 'Min: ' + min + ' cm')
+                : badge('badge-none', sup ? 'No min height' : 'No height req.');
+        } else {
+            if (sup) badges += badge('badge-companion', cat === 'with_companion' ? '&lt;' + sup + 'cm needs companion' : 'With companion: ' + sup + 'cm+');
+            if (min) badges += badge('badge-height', 'Solo: ' + min + 'cm+');
+        }
+        if (r[F.advisory_age]) badges += badge('badge-age', 'Age ' + r[F.advisory_age] + '+');
+        return '<a href="' + esc(r[F.url]) + '" target="_blank" rel="noopener" class="attraction-card">' +
+            '<div class="attraction-name">' + esc(r[F.name]) + '</div>' +
+            '<div class="attraction-type">' + esc(r[F.type_label]) + '</div>' +
+            (cat === 'not_available' ? '' : waitHtml(r)) +
+            '<div class="attraction-badges">' + badges + '</div>' +
+            (r[F.notes] ? '<div class="attraction-notes">' + esc(r[F.notes]) + '</div>' : '') +
+            iconsHtml(r[F.access]) + '</a>';
+    }
+
+    function section(cls, icon, title, rows, cat, intro) {
+        return '<div class="category ' + cls + '"><h2><span class="category-icon">' + icon + '</span> ' +
+            title + ' (' + rows.length + ')</h2>' + (intro || '') + '<div class="attractions-grid">' +
+            rows.map(function (r) { return card(r, cat); }).join('') + '</div></div>';
+    }
+
+    function summary(number, label) {
+        return '<div class="summary-card"><div class="summary-number">' + number + '</div><div class="summary-label">' + label + '</div></div>';
+    }
+
+    function markSelected(height) {
+        document.querySelectorAll('.height-btn').forEach(function (btn) {
+            btn.classList.toggle('active', Number(btn.dataset.height) === height);
+        });
+        document.querySelector('.height-input').value = height;
+    }
+
+    function render(height) {
+        var groups = {independent: [], with_companion: [], not_available: []};
+        var code = codes(height);
+        markSelected(height);
+        if (code === null) {
+            document.getElementById('results').innerHTML = '<p class="section-note">📏 ' + esc(height) +
+                ' cm is out of range: heights from ' + payload.ranges.min_height + ' to ' +
+                payload.ranges.max_height + ' cm are covered</p>';
+            return;
+        }
+        payload.rows.forEach(function (r, i) { groups[CATS[code.charCodeAt(i) - 48]].push(r); });
+        var companion = groups.with_companion, html = '<div class="summary-cards">' +
+            summary(groups.independent.length, '✅ Independent') +
+            summary(companion.length, '👨‍👧 With Companion') +
+            summary(groups.not_available.length, '❌ Not Available') +
+            summary(groups.independent.length + companion.length, '🎯 Total Accessible') + '</div>';
+        if (payload.park_open !== null) {
+            html += payload.park_open
+                ? '<div class="park-status open">🎢 Park is OPEN - Live wait times available</div>'
+                : '<div class="park-status closed">🌙 Park is CLOSED - Wait times unavailable</div>';
+        }
+        html += section('available', '✅', 'Can Ride Independently', groups.independent, 'independent');
+        if (companion.length) {
+            var age = companion[0][F.companion_age];
+            html += section('companion', '👨‍👧', 'With Supervision/Companion', companion, 'with_companion',
+                '<p class="category-intro">' + (age ? 'Children this height need an accompanying person aged ' + age + '+' : 'Children this height need adult supervision') + '</p>');
+        }
+        if (groups.not_available.length) {
+            html += section('unavailable', '❌', 'Not Available Yet', groups.not_available, 'not_available');
+        }
+        document.getElementById('results').innerHTML = html;
+    }
+
+    function renderTable() {
+        document.getElementById('requirements-body').innerHTML = payload.rows.map(function (r) {
+            var min = r[F.min], sup = r[F.sup], age = r[F.advisory_age];
+            return '<tr class="clickable-row" data-url="' + esc(r[F.url]) + '">' +
+                '<td><a href="' + esc(r[F.url]) + '" target="_blank" class="external-link">' + esc(r[F.name]) + ' ↗</a></td>' +
+                '<td>' + esc(r[F.type]) + '</td>' +
+                '<td>' + (min ? min + 'cm+' : sup ? sup + 'cm+' : '✓ Any height') + '</td>' +
+                '<td>' + (min && sup ? sup + '-' + min + 'cm' : sup && !min ? 'Below ' + sup + 'cm' : '-') + '</td>' +
+                '<td>' + (age ? age + '+' : '-') + '</td></tr>';
+        }).join('');
+    }
+
+    document.querySelectorAll('.height-btn').forEach(function (btn) {
+        btn.addEventListener('click', function () { render(Number(btn.dataset.height)); });
+    });
+    document.querySelector('.height-input').addEventListener('change', function (e) {
+        var height = parseInt(e.target.value, 10);
+        if (!isNaN(height)) render(height);
+    });
+    document.getElementById('requirements-body').addEventListener('click', function (e) {
+        var row = e.target.closest('.clickable-row');
+        if (row && !e.target.closest('a')) window.open(row.dataset.url, '_blank');
+    });
+
+    renderTable();
+    render(payload.default_height);
+})();
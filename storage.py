@@ -0,0 +1,777 @@
+#!/usr/bin/env python3
+"""
+Efteling Data Storage
+Repository layer over the attraction and wait time data.
+Backends: plain JSON files (default) or SQLite (WAL mode)
+"""
+
+import json
+import logging
+import os
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from rules import height_ranges
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(os.environ.get("DATA_DIR", "/app/data"))
+
+# "json" or "sqlite". Unset, a volume that already holds efteling.db stays on sqlite, so a
+# process started without the deployment's environment never writes a second copy beside it.
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND") or ("sqlite" if (DATA_DIR / "efteling.db").exists() else "json")
+
+# Attractions file encoding for the json backend: "json" or "sections"
+DATA_FORMAT = os.environ.get("DATA_FORMAT", "json")
+
+# Payload codec inside the sectioned file: "json" (orjson when installed) or "msgpack"
+DATA_CODEC = os.environ.get("DATA_CODEC", "json")
+
+# Change log entries kept for /api/changes; older clients get a full document.
+# At one wait time poll per 5 minutes this covers a few days.
+CHANGE_LOG_LIMIT = 1000
+
+# Scrape runs kept for /api/scrape/stats; at one scrape per 6 hours about a month
+SCRAPE_RUN_LIMIT = 120
+
+# Per page diagnostics of a scrape run (scraper.new_page_record), stored as rows in this order
+SCRAPE_PAGE_FIELDS = ("name", "status", "http_status", "bytes", "fetch_ms", "parse_ms", "rules", "fallback_fields", "error")
+
+
+def parse_timestamp(value: str) -> datetime:
+    """ISO 8601 timestamp -> aware datetime; naive values are local time (as written by the scraper)"""
+    return datetime.fromisoformat(value).astimezone(timezone.utc)
+
+
+def format_fetched_at(moment: datetime) -> str:
+    """Aware datetime in the fetched_at format written by wait_times.py, so strings sort chronologically"""
+    return moment.astimezone(timezone.utc).replace(tzinfo=None).isoformat(timespec="microseconds") + "Z"
+
+
+def pack_scrape_run(run: dict) -> dict:
+    """{"started_at", "duration_ms", "pages": [page dicts]} -> stored form with one field list and row arrays"""
+    return {
+        "started_at": run["started_at"],
+        "duration_ms": run["duration_ms"],
+        "fields": list(SCRAPE_PAGE_FIELDS),
+        "pages": [[page.get(field) for field in SCRAPE_PAGE_FIELDS] for page in run["pages"]],
+    }
+
+
+def unpack_scrape_run(stored: dict) -> dict:
+    return {
+        "started_at": stored["started_at"],
+        "duration_ms": stored["duration_ms"],
+        "pages": [dict(zip(stored["fields"], row)) for row in stored["pages"]],
+    }
+
+
+def _dump_json_atomic(path: Path, value) -> None:
+    """Compact JSON written to a temporary file first, so readers never see half a file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = path.with_suffix(".tmp")
+    with open(tmp_file, 'w') as f:
+        json.dump(value, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_file, path)
+
+
+class JsonStorage:
+    """
+    Whole-document storage in attractions / wait_times files.
+    DATA_FORMAT picks the attractions file encoding: "json" (indented attractions.json)
+    or "sections" (attractions.efts, see serialization.py) which can be decoded per section.
+    """
+
+    # Wait times are merged into the attractions document by wait_times.py
+    joins_wait_times = False
+
+    def __init__(self, data_dir: Path = DATA_DIR, data_format: str = DATA_FORMAT):
+        if data_format not in ("json", "sections"):
+            raise ValueError(f"Unknown DATA_FORMAT {data_format!r}, expected 'json' or 'sections'")
+        self.data_dir = Path(data_dir)
+        self.data_format = data_format
+        suffix = "json" if data_format == "json" else "efts"
+        self.attractions_file = self.data_dir / f"attractions.{suffix}"
+        self.wait_times_file = self.data_dir / "wait_times.json"
+        self.ride_ids_file = self.data_dir / "ride_ids.json"
+        self.changes_file = self.data_dir / "changes.json"
+        self.scrape_runs_file = self.data_dir / "scrape_runs.json"
+
+    def generation(self):
+        """Token that changes whenever the attractions document is rewritten"""
+        try:
+            stat = self.attractions_file.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load_data(self, sections: Optional[Iterable[str]] = None) -> Optional[dict]:
+        """Load the attractions document, or only the given top-level sections"""
+        if not self.attractions_file.exists():
+            return None
+        if self.data_format == "json":
+            with open(self.attractions_file) as f:
+                data = json.load(f)
+            return data if sections is None else {k: data[k] for k in sections if k in data}
+        from serialization import SectionReader  # pulls in orjson/msgpack, only needed here
+
+        with open(self.attractions_file, 'rb') as f:
+            return SectionReader(f.read()).load(sections)
+
+    def save_data(self, data: dict) -> None:
+        """Save the full attractions document"""
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        if self.data_format == "json":
+            payload = json.dumps(data, indent=2, ensure_ascii=False).encode()
+        else:
+            from serialization import dumps_sections, get_codec
+
+            payload = dumps_sections(data, get_codec(DATA_CODEC))
+        with open(self.attractions_file, 'wb') as f:
+            f.write(payload)
+
+    def load_wait_times(self) -> Optional[dict]:
+        """Load the last wait times snapshot"""
+        if self.wait_times_file.exists():
+            with open(self.wait_times_file) as f:
+                return json.load(f)
+        return None
+
+    def save_wait_times(self, data: dict) -> None:
+        """Save a wait times snapshot"""
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.wait_times_file, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    def iter_wait_history(self, since: Optional[datetime] = None) -> Iterator[dict]:
+        """Wait samples fetched after since; JSON files only keep the last fetch"""
+        data = self.load_wait_times()
+        if not data or not data.get("fetched_at"):
+            return
+        if since is not None and parse_timestamp(data["fetched_at"]) <= since:
+            return
+        for ride, wt in data.get("wait_times", {}).items():
+            yield {
+                "ride": ride,
+                "fetched_at": data["fetched_at"],
+                "is_open": wt.get("is_open"),
+                "wait_time": wt.get("wait_time"),
+            }
+
+    def load_ride_ids(self) -> Dict[int, dict]:
+        """Queue-Times ride id -> {"slug", "name"} (the upstream name it was matched by)"""
+        if not self.ride_ids_file.exists():
+            return {}
+        with open(self.ride_ids_file) as f:
+            return {int(ride_id): entry for ride_id, entry in json.load(f).items()}
+
+    def save_ride_ids(self, ride_ids: Dict[int, dict]) -> None:
+        _dump_json_atomic(self.ride_ids_file, {str(ride_id): entry for ride_id, entry in sorted(ride_ids.items())})
+
+    def _load_change_log(self) -> dict:
+        if not self.changes_file.exists():
+            return {"generation": 0, "entries": []}
+        with open(self.changes_file) as f:
+            return json.load(f)
+
+    def change_generation(self) -> int:
+        """Number of the last recorded change, 0 if nothing was recorded yet"""
+        return self._load_change_log()["generation"]
+
+    def record_changes(self, changes: Optional[dict]) -> int:
+        """Append a change set (None: everything changed) and return its generation"""
+        log = self._load_change_log()
+        log["generation"] += 1
+        log["entries"].append({
+            "generation": log["generation"],
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "changes": changes,
+        })
+        del log["entries"][:-CHANGE_LOG_LIMIT]
+        _dump_json_atomic(self.changes_file, log)
+        return log["generation"]
+
+    def changes_since(self, since: int, until: int) -> Optional[List[dict]]:
+        """Change sets after since up to until, None if the log no longer covers that range"""
+        entries = [e for e in self._load_change_log()["entries"] if since < e["generation"] <= until]
+        return _complete_changes(entries, since, until)
+
+    def _load_scrape_runs(self) -> List[dict]:
+        if not self.scrape_runs_file.exists():
+            return []
+        with open(self.scrape_runs_file) as f:
+            return json.load(f)
+
+    def record_scrape_run(self, run: dict) -> None:
+        """Store the page records of one scrape run, dropping the oldest beyond SCRAPE_RUN_LIMIT"""
+        runs = self._load_scrape_runs()
+        runs.append(pack_scrape_run(run))
+        _dump_json_atomic(self.scrape_runs_file, runs[-SCRAPE_RUN_LIMIT:])
+
+    def load_scrape_runs(self, limit: int = SCRAPE_RUN_LIMIT) -> List[dict]:
+        """The last limit scrape runs, newest first"""
+        return [unpack_scrape_run(run) for run in reversed(self._load_scrape_runs()[-limit:])]
+
+
+def _complete_changes(entries: List[dict], since: int, until: int) -> Optional[List[dict]]:
+    """Change sets if entries is the gapless range since+1..until without a full reset"""
+    if since > until or len(entries) != until - since:
+        return None
+    if any(e["changes"] is None for e in entries):
+        return None
+    return [e["changes"] for e in entries]
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attractions (
+    id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL UNIQUE,
+    name_dutch TEXT,
+    type TEXT,
+    type_dutch TEXT,
+    min_height_cm INTEGER,
+    supervision_height_cm INTEGER,
+    companion_age INTEGER,
+    advisory_age INTEGER,
+    notes TEXT,
+    url TEXT,
+    slug TEXT,
+    category TEXT,
+    scrape_status TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_attractions_min_height ON attractions (min_height_cm);
+CREATE INDEX IF NOT EXISTS idx_attractions_supervision_height ON attractions (supervision_height_cm);
+
+CREATE TABLE IF NOT EXISTS access_conditions (
+    attraction_id INTEGER NOT NULL REFERENCES attractions (id) ON DELETE CASCADE,
+    condition TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (attraction_id, condition)
+);
+CREATE INDEX IF NOT EXISTS idx_access_condition ON access_conditions (condition, value);
+
+-- Waits are keyed by ride: the attraction slug, or queue-times-<id> for rides we don't list
+CREATE TABLE IF NOT EXISTS live_waits (
+    ride TEXT PRIMARY KEY,
+    name TEXT,
+    original_name TEXT,
+    is_open INTEGER,
+    wait_time INTEGER,
+    wait_time_max INTEGER,  -- rides with several tracks (wait_times.aggregate_tracks)
+    tracks TEXT,  -- JSON, NULL for a single track
+    last_updated TEXT
+);
+
+CREATE TABLE IF NOT EXISTS wait_history (
+    id INTEGER PRIMARY KEY,
+    ride TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    is_open INTEGER,
+    wait_time INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_wait_history_ride ON wait_history (ride, fetched_at);
+
+CREATE TABLE IF NOT EXISTS ride_ids (
+    ride_id INTEGER PRIMARY KEY,  -- Queue-Times ride id
+    slug TEXT NOT NULL,
+    name TEXT  -- upstream name it was matched by
+);
+
+CREATE TABLE IF NOT EXISTS change_log (
+    generation INTEGER PRIMARY KEY,
+    recorded_at TEXT NOT NULL,
+    changes TEXT  -- JSON change set, NULL when everything changed
+);
+
+CREATE TABLE IF NOT EXISTS scrape_runs (
+    id INTEGER PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    run TEXT NOT NULL  -- JSON, pages packed as rows (pack_scrape_run)
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+ATTRACTION_COLUMNS = [
+    "name", "name_dutch", "type", "type_dutch", "min_height_cm", "supervision_height_cm",
+    "companion_age", "advisory_age", "notes", "url", "slug", "category", "scrape_status",
+]
+
+# Document keys stored as JSON blobs in the meta table
+META_KEYS = ["last_updated", "total_attractions", "total_shows", "scrape_stats", "shows", "sources"]
+
+
+class SqliteStorage:
+    """Row-level storage in a single SQLite database (WAL mode)"""
+
+    # Live waits are joined onto attractions at read time, no merge rewrite needed
+    joins_wait_times = True
+
+    def __init__(self, data_dir: Path = DATA_DIR):
+        self.data_dir = Path(data_dir)
+        self.db_file = self.data_dir / "efteling.db"
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection, yield it inside a transaction and close it afterwards"""
+        import sqlite3  # only the sqlite backend pays for it
+
+        if not self._initialized:
+            self.data_dir.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        try:
+            conn.execute("PRAGMA foreign_keys = ON")
+            if not self._initialized:
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.executescript(SQLITE_SCHEMA)
+                self._initialized = True
+            conn.execute("PRAGMA synchronous = NORMAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _get_meta(self, conn, key: str):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_meta(self, conn, key: str, value) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, json.dumps(value, ensure_ascii=False)),
+        )
+
+    def _bump_generation(self, conn) -> None:
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('generation', '1') "
+            "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+
+    def generation(self):
+        """Counter bumped by every write"""
+        if not self.db_file.exists():
+            return None
+        with self._connect() as conn:
+            return self._get_meta(conn, "generation")
+
+    def load_data(self, sections: Optional[Iterable[str]] = None) -> Optional[dict]:
+        """Rebuild the attractions document from tables (sections are always all present)"""
+        with self._connect() as conn:
+            if self._get_meta(conn, "last_updated") is None:
+                return None
+
+            data = {key: self._get_meta(conn, key) for key in META_KEYS}
+            wait_times_info = self._get_meta(conn, "wait_times_info")
+
+            access = {}
+            for attraction_id, condition, value in conn.execute(
+                "SELECT attraction_id, condition, value FROM access_conditions"
+            ):
+                access.setdefault(attraction_id, {})[condition] = json.loads(value)
+
+            live_waits = {}
+            if wait_times_info:
+                for ride, is_open, wait_time, last_updated in conn.execute(
+                    "SELECT ride, is_open, wait_time, last_updated FROM live_waits"
+                ):
+                    live_waits[ride] = (bool(is_open), wait_time, last_updated)
+
+            attractions = []
+            columns = ", ".join(ATTRACTION_COLUMNS)
+            for row in conn.execute(f"SELECT id, {columns} FROM attractions ORDER BY position"):
+                attr = dict(zip(ATTRACTION_COLUMNS, row[1:]))
+                attr["access"] = access.get(row[0], {})
+                if wait_times_info:
+                    # Same semantics as wait_times.merge_wait_times_with_attractions
+                    is_open, wait_time, last_updated = live_waits.get(attr["slug"], (None, None, None))
+                    attr["is_open"] = is_open
+                    attr["wait_time"] = wait_time if is_open else None
+                    attr["wait_last_updated"] = last_updated
+                attractions.append(attr)
+
+        data["attractions"] = attractions
+        data["height_ranges"] = height_ranges(attractions)
+        if wait_times_info:
+            data["wait_times_info"] = wait_times_info
+        return data
+
+    def save_data(self, data: dict) -> None:
+        """Replace attractions, access conditions and document metadata"""
+        from model import attraction_slug
+
+        placeholders = ", ".join("?" for _ in ATTRACTION_COLUMNS)
+        columns = ", ".join(ATTRACTION_COLUMNS)
+
+        with self._connect() as conn:
+            conn.execute("DELETE FROM attractions")
+            for position, attr in enumerate(data.get("attractions", [])):
+                cursor = conn.execute(
+                    f"INSERT INTO attractions (position, {columns}) VALUES (?, {placeholders})",
+                    [position] + [attraction_slug(attr) if c == "slug" else attr.get(c) for c in ATTRACTION_COLUMNS],
+                )
+                conn.executemany(
+                    "INSERT INTO access_conditions (attraction_id, condition, value) VALUES (?, ?, ?)",
+                    [(cursor.lastrowid, k, json.dumps(v)) for k, v in (attr.get("access") or {}).items()],
+                )
+            for key in META_KEYS:
+                self._set_meta(conn, key, data.get(key))
+            if "wait_times_info" in data:
+                self._set_meta(conn, "wait_times_info", data["wait_times_info"])
+            self._bump_generation(conn)
+
+    def load_wait_times(self) -> Optional[dict]:
+        """Rebuild the last wait times snapshot from live_waits"""
+        with self._connect() as conn:
+            info = self._get_meta(conn, "wait_times_info")
+            if info is None:
+                return None
+            wait_times = {}
+            for ride, name, original_name, is_open, wait_time, wait_time_max, tracks, last_updated in conn.execute(
+                "SELECT ride, name, original_name, is_open, wait_time, wait_time_max, tracks, last_updated "
+                "FROM live_waits"
+            ):
+                entry = wait_times[ride] = {
+                    "name": name,
+                    "original_name": original_name,
+                    "is_open": bool(is_open),
+                    "wait_time": wait_time,
+                    "last_updated": last_updated,
+                }
+                if tracks is not None:
+                    entry.update(wait_time_max=wait_time_max, tracks=json.loads(tracks))
+        return dict(info, wait_times=wait_times)
+
+    def save_wait_times(self, data: dict) -> None:
+        """Replace live waits, append them to the history and store the fetch metadata"""
+        fetched_at = data.get("fetched_at")
+        rows = [
+            (ride, wt.get("name"), wt.get("original_name"), wt.get("is_open"), wt.get("wait_time"),
+             wt.get("wait_time_max"), None if wt.get("tracks") is None else json.dumps(wt["tracks"], ensure_ascii=False),
+             wt.get("last_updated"))
+            for ride, wt in data.get("wait_times", {}).items()
+        ]
+
+        with self._connect() as conn:
+            conn.execute("DELETE FROM live_waits")
+            conn.executemany(
+                "INSERT OR REPLACE INTO live_waits "
+                "(ride, name, original_name, is_open, wait_time, wait_time_max, tracks, last_updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.executemany(
+                "INSERT INTO wait_history (ride, fetched_at, is_open, wait_time) VALUES (?, ?, ?, ?)",
+                [(ride, fetched_at, is_open, wait_time) for ride, _, _, is_open, wait_time, _, _, _ in rows],
+            )
+            self._set_meta(conn, "wait_times_info", {
+                "fetched_at": fetched_at,
+                "park_open": data.get("park_open"),
+                "source": data.get("source"),
+                "attribution": data.get("attribution"),
+            })
+            self._bump_generation(conn)
+
+    def iter_wait_history(self, since: Optional[datetime] = None) -> Iterator[dict]:
+        """Wait samples fetched after since, oldest first, streamed from the cursor"""
+        query = "SELECT ride, fetched_at, is_open, wait_time FROM wait_history"
+        params = ()
+        if since is not None:
+            query += " WHERE fetched_at > ?"
+            params = (format_fetched_at(since),)
+        with self._connect() as conn:
+            for ride, fetched_at, is_open, wait_time in conn.execute(query + " ORDER BY id", params):
+                yield {
+                    "ride": ride,
+                    "fetched_at": fetched_at,
+                    "is_open": None if is_open is None else bool(is_open),
+                    "wait_time": wait_time,
+                }
+
+    def load_ride_ids(self) -> Dict[int, dict]:
+        """Queue-Times ride id -> {"slug", "name"} (the upstream name it was matched by)"""
+        with self._connect() as conn:
+            return {
+                ride_id: {"slug": slug, "name": name}
+                for ride_id, slug, name in conn.execute("SELECT ride_id, slug, name FROM ride_ids")
+            }
+
+    def save_ride_ids(self, ride_ids: Dict[int, dict]) -> None:
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO ride_ids (ride_id, slug, name) VALUES (?, ?, ?)",
+                [(ride_id, entry["slug"], entry.get("name")) for ride_id, entry in ride_ids.items()],
+            )
+
+    def change_generation(self) -> int:
+        """Number of the last recorded change, 0 if nothing was recorded yet"""
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(MAX(generation), 0) FROM change_log").fetchone()[0]
+
+    def record_changes(self, changes: Optional[dict]) -> int:
+        """Append a change set (None: everything changed) and return its generation"""
+        with self._connect() as conn:
+            generation = conn.execute("SELECT COALESCE(MAX(generation), 0) + 1 FROM change_log").fetchone()[0]
+            conn.execute(
+                "INSERT INTO change_log (generation, recorded_at, changes) VALUES (?, ?, ?)",
+                (generation, datetime.now(timezone.utc).isoformat(),
+                 None if changes is None else json.dumps(changes, ensure_ascii=False)),
+            )
+            conn.execute("DELETE FROM change_log WHERE generation <= ?", (generation - CHANGE_LOG_LIMIT,))
+        return generation
+
+    def changes_since(self, since: int, until: int) -> Optional[List[dict]]:
+        """Change sets after since up to until, None if the log no longer covers that range"""
+        with self._connect() as conn:
+            entries = [
+                {"generation": generation, "changes": None if changes is None else json.loads(changes)}
+                for generation, changes in conn.execute(
+                    "SELECT generation, changes FROM change_log WHERE generation > ? AND generation <= ? "
+                    "ORDER BY generation",
+                    (since, until),
+                )
+            ]
+        return _complete_changes(entries, since, until)
+
+    def record_scrape_run(self, run: dict) -> None:
+        """Store the page records of one scrape run, dropping the oldest beyond SCRAPE_RUN_LIMIT"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO scrape_runs (started_at, run) VALUES (?, ?)",
+                (run["started_at"], json.dumps(pack_scrape_run(run), ensure_ascii=False, separators=(',', ':'))),
+            )
+            conn.execute("DELETE FROM scrape_runs WHERE id <= ?", (cursor.lastrowid - SCRAPE_RUN_LIMIT,))
+
+    def load_scrape_runs(self, limit: int = SCRAPE_RUN_LIMIT) -> List[dict]:
+        """The last limit scrape runs, newest first"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT run FROM scrape_runs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [unpack_scrape_run(json.loads(run)) for run, in rows]
+
+
+# Snapshot published by the writers as a sectioned container (serialization.py): the document
+# sections plus the response bodies of the generation, prepared and compressed by the writer.
+# Web workers map it (PublishedSnapshot). Data only, no pickle: whoever can write the data
+# volume must not be able to run code in them.
+SNAPSHOT_FILE = DATA_DIR / "snapshot.efts"
+
+# Held while a snapshot is published, so two writers (scrape and wait times fetch) cannot
+# hand out the same change generation or drop each other's change log entry
+PUBLISH_LOCK_FILE = DATA_DIR / "publish.lock"
+
+
+@contextmanager
+def publish_lock(lock_file: Path = PUBLISH_LOCK_FILE):
+    """Exclusive fcntl lock on the data volume, the same kind leader.FileLeases uses"""
+    import fcntl
+
+    lock_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_file, "a") as f:
+        fcntl.lockf(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.lockf(f, fcntl.LOCK_UN)
+
+
+def publish_snapshot(storage=None, share: bool = True) -> None:
+    """
+    Build the in-memory Snapshot once in the writer and publish it atomically.
+    The difference to the previously published snapshot goes to the change log
+    first, and the snapshot carries the resulting change generation.
+    With a shared cache it is also handed to the other replicas, unless share is False.
+    Publishers take turns (publish_lock), each diffing against its predecessor's snapshot.
+    """
+    from shared import get_shared, share_snapshot
+
+    storage = storage or get_storage()
+    with publish_lock():
+        snapshot = _publish(storage)
+    if snapshot is None:
+        return
+
+    shared = get_shared() if share else None
+    if shared is not None:
+        try:
+            share_snapshot(shared, snapshot)
+            logger.info(f"Shared snapshot generation {snapshot.generation} with the other replicas")
+        except Exception as e:
+            # The local snapshot is published; replicas catch up with the next one
+            logger.warning(f"Could not share the snapshot: {e}")
+
+
+def _publish(storage):
+    """Record the change and write the snapshot file; the published Snapshot, None without data"""
+    from dataclasses import replace
+    from model import Snapshot, diff_snapshots
+
+    from breaker import failing_upstreams
+
+    data = storage.load_data()
+    if data is None:
+        return None
+    data["upstreams"] = failing_upstreams(storage.data_dir)
+    snapshot = Snapshot.from_dict(data)
+
+    try:
+        previous = PublishedSnapshot().snapshot if SNAPSHOT_FILE.exists() else None
+    except Exception as e:  # e.g. truncated by a full disk, or another model version
+        logger.warning(f"Ignoring unreadable published snapshot: {e}")
+        previous = None
+    if previous is not None and isinstance(previous.generation, int):
+        changes = diff_snapshots(previous, snapshot)
+        generation = storage.record_changes(changes) if changes else previous.generation
+    else:
+        # No comparable predecessor: clients have to start over from a full document
+        generation = storage.record_changes(None)
+    snapshot = replace(snapshot, generation=generation)
+
+    tmp_file = SNAPSHOT_FILE.with_suffix(".tmp")
+    with open(tmp_file, 'wb') as f:
+        f.write(encode_published_snapshot(snapshot))
+    os.replace(tmp_file, SNAPSHOT_FILE)
+    logger.info(f"Published snapshot to {SNAPSHOT_FILE}")
+    return snapshot
+
+
+def published_snapshot_key():
+    """Cheap token identifying the currently published snapshot file, None if there is none"""
+    try:
+        stat = SNAPSHOT_FILE.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+
+def snapshot_bodies(snapshot) -> Dict[str, bytes]:
+    """
+    Response bodies of a generation that only depend on the data, by name: "data" for
+    /api/data and "height-range/<index>" for /api/height in that range (see app.py)
+    """
+    from serialization import get_codec
+
+    codec = get_codec("json")
+    bodies = {"data": codec.encode(snapshot.to_dict())}
+    for index, categories in enumerate(snapshot.height_ranges.categories):
+        bodies[f"height-range/{index}"] = codec.encode(categories.to_dict(snapshot.has_wait_times))
+    return bodies
+
+
+def encode_published_snapshot(snapshot) -> bytes:
+    """
+    The snapshot file: "meta" (model version, generation), one section per document key and
+    raw "body/<name>" sections with each body and its precompressed "body/<name>.<encoding>"
+    """
+    from compression import PreparedBody
+    from model import MODEL_VERSION
+    from serialization import dumps_sections
+
+    data = snapshot.to_dict()
+    del data["height_categories"]  # derived from height_ranges again on load
+    raw = {}
+    for name, body in snapshot_bodies(snapshot).items():
+        prepared = PreparedBody.build(body)
+        raw[f"body/{name}"] = prepared.raw
+        raw.update((f"body/{name}.{encoding}", encoded) for encoding, encoded in prepared.encoded.items())
+    meta = {"model_version": MODEL_VERSION, "generation": snapshot.generation}
+    return dumps_sections(dict(data, meta=meta), raw=raw)
+
+
+class PublishedSnapshot:
+    """
+    The published snapshot file, mapped read-only. Sections are decoded on first use, so
+    serving a prepared body never decodes the document, and the bodies are served from the
+    mapping: every worker reads the same page cache pages instead of building its own copy.
+    The Snapshot model, needed by the pages and the query routes, is built per worker on first
+    use. A file written by a different model version raises ValueError.
+    """
+
+    def __init__(self, path: Path = None):
+        import mmap
+        from model import MODEL_VERSION
+        from serialization import SectionReader
+
+        with open(path or SNAPSHOT_FILE, 'rb') as f:
+            # The mapping stays valid after the writer replaces the file
+            self._mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.reader = SectionReader(self._mapped)
+        meta = self.reader.read("meta")
+        if meta.get("model_version") != MODEL_VERSION:
+            raise ValueError(f"Snapshot written by model version {meta.get('model_version')}, expected {MODEL_VERSION}")
+        self.generation = meta["generation"]
+        self._snapshot = None
+
+    @property
+    def snapshot(self):
+        if self._snapshot is None:
+            from model import Snapshot
+
+            keys = [key for key in self.reader.keys() if key != "meta" and not key.startswith("body/")]
+            self._snapshot = Snapshot.from_dict(self.reader.load(keys), self.generation)
+        return self._snapshot
+
+    def height_range(self, height_cm: int) -> Optional[int]:
+        """HeightRanges.index() from the height_ranges section alone"""
+        ranges = self.reader.read("height_ranges")
+        if not ranges["min_height"] <= height_cm <= ranges["max_height"]:
+            return None
+        return bisect_right(ranges["breakpoints"], height_cm) - 1
+
+    def body(self, name: str):
+        """PreparedBody of a snapshot_bodies() name, views into the mapping; None if not published"""
+        from compression import ENCODERS, PreparedBody
+
+        key = f"body/{name}"
+        if key not in self.reader:
+            return None
+        return PreparedBody(self.reader.raw(key), {
+            encoding: self.reader.raw(f"{key}.{encoding}")
+            for encoding in ENCODERS if f"{key}.{encoding}" in self.reader
+        })
+
+
+def encode_snapshot(snapshot) -> bytes:
+    """Snapshot as a JSON document tagged with the model version and its generation (shared cache)"""
+    from model import MODEL_VERSION
+    from serialization import get_codec
+
+    data = snapshot.to_dict()
+    del data["height_categories"]  # derived from height_ranges again on load
+    return get_codec("json").encode({"model_version": MODEL_VERSION, "generation": snapshot.generation, "data": data})
+
+
+def decode_snapshot(buffer):
+    """The Snapshot of an encode_snapshot() document, None if a different model version wrote it"""
+    from model import MODEL_VERSION, Snapshot
+    from serialization import get_codec
+
+    payload = get_codec("json").decode(buffer)
+    if not isinstance(payload, dict) or payload.get("model_version") != MODEL_VERSION:
+        return None
+    return Snapshot.from_dict(payload["data"], payload["generation"])
+
+
+BACKENDS = {
+    "json": JsonStorage,
+    "sqlite": SqliteStorage,
+}
+
+_storage = None
+
+
+def get_storage():
+    """Return the process-wide storage backend selected by STORAGE_BACKEND"""
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND not in BACKENDS:
+            raise ValueError(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r}, expected one of {sorted(BACKENDS)}")
+        _storage = BACKENDS[STORAGE_BACKEND]()
+        logger.info(f"Using {STORAGE_BACKEND} storage in {_storage.data_dir}")
+    return _storage
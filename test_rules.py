@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Parity of rules.py with the per-attraction loop it replaced (python -m pytest)
+"""
+
+import itertools
+
+import pytest
+
+from benchmark import _legacy_categorize_by_height, sample_data
+from model import Snapshot
+from rules import CATEGORIES, MAX_HEIGHT, MIN_HEIGHT, CategoryMatrix, categorize_heights, category_for_height, height_pairs
+
+HEIGHTS = range(0, 251)
+
+# Every None/edge combination of the two thresholds
+VALUES = [None, 0, 80, 95, 100, 110, 120, 132, 150, 210]
+SYNTHETIC = [{"min_height_cm": m, "supervision_height_cm": s} for m, s in itertools.product(VALUES, VALUES)]
+
+
+@pytest.fixture(scope="module")
+def data():
+    return sample_data()
+
+
+@pytest.fixture(scope="module", params=["park", "synthetic"])
+def attractions(request, data):
+    return data["attractions"] if request.param == "park" else SYNTHETIC
+
+
+def test_matrix_matches_legacy_loop(attractions):
+    matrix = CategoryMatrix.build(height_pairs(attractions), HEIGHTS)
+    for h in HEIGHTS:
+        legacy = _legacy_categorize_by_height(attractions, h)
+        column = [CATEGORIES[code] for code in matrix.column(h)]
+        for category in CATEGORIES:
+            assert [a for a, c in zip(attractions, column) if c == category] == legacy[category], h
+
+
+def test_matrix_matches_category_for_height(attractions):
+    matrix = CategoryMatrix.build(height_pairs(attractions), HEIGHTS)
+    for h in HEIGHTS:
+        for attr, code in zip(attractions, matrix.column(h)):
+            assert CATEGORIES[code] == category_for_height(attr["min_height_cm"], attr["supervision_height_cm"], h)
+
+
+def test_categorize_heights_matches_legacy_loop(attractions):
+    result = categorize_heights(attractions, HEIGHTS)
+    for h in HEIGHTS:
+        assert result[str(h)] == _legacy_categorize_by_height(attractions, h), h
+
+
+def test_height_ranges_match_legacy_loop(data):
+    ranges = Snapshot.from_dict(data).height_ranges
+    for h in range(MIN_HEIGHT, MAX_HEIGHT + 1):
+        categories = ranges.lookup(h)
+        legacy = _legacy_categorize_by_height(data["attractions"], h)
+        for category in CATEGORIES:
+            assert [a.name for a in getattr(categories, category)] == [a["name"] for a in legacy[category]], h
+
+
+def test_height_ranges_bounds(data):
+    ranges = Snapshot.from_dict(data).height_ranges
+    assert ranges.index(MIN_HEIGHT - 1) is None
+    assert ranges.index(MAX_HEIGHT + 1) is None
+    assert ranges.index(MIN_HEIGHT) == 0
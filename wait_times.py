@@ -7,13 +7,16 @@ Updates every 5 minutes during park hours
 
 import json
 import logging
-import os
 from datetime import datetime, timedelta
-from pathlib import Path
-from typing import Optional
-import requests
+from typing import Dict, List, Optional, Tuple
+
+from breaker import CONNECT_TIMEOUT, CircuitBreaker
+from leader import is_leader
+from matching import NameMatcher
+from model import attraction_slug
+from rules import height_ranges
+from storage import get_storage, publish_snapshot
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # Queue-Times.com API (free, requires attribution)
@@ -21,92 +24,146 @@ QUEUE_TIMES_API = "https://queue-times.com/parks/160/queue_times.json"
 QUEUE_TIMES_ATTRIBUTION = "Powered by Queue-Times.com"
 QUEUE_TIMES_URL = "https://queue-times.com/parks/160"
 
-# Data storage
-DATA_DIR = Path(os.environ.get("DATA_DIR", "/app/data"))
-WAIT_TIMES_FILE = DATA_DIR / "wait_times.json"
-ATTRACTIONS_FILE = DATA_DIR / "attractions.json"
-
-# Name mapping: Queue-Times name -> Our attraction name
+# Queue-Times names that don't resemble ours -> our name. Everything else, including
+# names equal to ours, is found by the NameMatcher; see ride_key().
 NAME_MAPPING = {
-    "Baron 1898": "Baron 1898",
-    "Python": "Python",
     "Joris en de Draak - Vuur": "Joris en de Draak",
     "Joris en de Draak - Water": "Joris en de Draak",
-    "Vogel Rok": "Vogel Rok",
-    "Max & Moritz": "Max & Moritz",
-    "De Vliegende Hollander": "De Vliegende Hollander",
-    "Piraña": "Piraña",
-    "Gondoletta": "Gondoletta",
-    "Symbolica": "Symbolica",
-    "Droomvlucht": "Droomvlucht",
-    "Fata Morgana": "Fata Morgana",
-    "Carnaval Festival": "Carnaval Festival",
-    "Villa Volta": "Villa Volta",
-    "Halve Maen": "Halve Maen",
-    "Pagode": "Pagode",
-    "Stoomtrein": "Stoomtrein",
     "Monorail": "De Monorail",
-    "De Oude Tufferbaan": "De Oude Tufferbaan",
-    "Kinderspoor": "Kinderspoor",
-    "Stoomcarrousel": "Stoomcarrousel",
-    "Danse Macabre": "Danse Macabre",
-    "Fabula": "Fabula",
-    "Sirocco": "Sirocco",
-    "Sprookjesbos": "Sprookjesbos",
     "Fairytale Forest": "Sprookjesbos",
-    "Spookslot": "Spookslot",
-    "Raveleijn": "Raveleijn",
-    "Aquanura": "Aquanura",
 }
 
+_matcher: Optional[NameMatcher] = None
+_slugs: Dict[str, str] = {}  # our attraction name -> slug
+_names: Dict[str, str] = {}  # slug -> our attraction name
+
+# Queue-Times ride id -> {"slug", "name"}: the persisted ID mapping, loaded once per process
+_ride_ids: Optional[Dict[int, dict]] = None
+_ride_ids_changed = False
+
+
+def get_matcher() -> NameMatcher:
+    """Matcher over our attraction names plus NAME_MAPPING, built on first use"""
+    global _matcher
+    if _matcher is None:
+        from scraper import ATTRACTION_SLUGS
+
+        _names.update((slug, info["name"]) for slug, info in ATTRACTION_SLUGS.items())
+        _slugs.update((name, slug) for slug, name in _names.items())
+        _matcher = NameMatcher(list(_names.values()) + list(NAME_MAPPING.values()), NAME_MAPPING)
+    return _matcher
+
+
+def get_ride_ids() -> Dict[int, dict]:
+    global _ride_ids
+    if _ride_ids is None:
+        _ride_ids = get_storage().load_ride_ids()
+    return _ride_ids
+
+
+def save_ride_ids() -> None:
+    """Persist rides mapped since the mapping was loaded"""
+    global _ride_ids_changed
+    if _ride_ids_changed:
+        get_storage().save_ride_ids(get_ride_ids())
+        _ride_ids_changed = False
+
+
+def ride_key(ride: dict) -> Tuple[str, str]:
+    """
+    (ride key, display name) of a Queue-Times ride. The key is the slug of the attraction it
+    belongs to, looked up by Queue-Times id in the persisted mapping, so renames on either
+    side don't matter. A ride id not seen before is matched by name and added, if the names
+    are equal once normalized. A merely similar name is used for this fetch only and logged,
+    so a wrong guess is never kept (add the name to NAME_MAPPING if it is right). Rides
+    we don't list are keyed queue-times-<id> and keep their own name.
+    """
+    global _ride_ids_changed
+    ride_id, name = ride.get("id"), ride.get("name", "")
+    matcher = get_matcher()  # also fills _names and _slugs
+    known = get_ride_ids().get(ride_id)
+    if known is not None:
+        return known["slug"], _names.get(known["slug"], name)
+
+    matched = matcher.exact(name)
+    fuzzy = matched is None
+    if fuzzy:
+        matched = matcher.match(name)
+    slug = _slugs.get(matched)
+    if slug is None:
+        if matched is None:
+            logger.info(f"No attraction matches Queue-Times ride {name!r}, keeping its name")
+        return (name if ride_id is None else f"queue-times-{ride_id}"), matched or name
+    if fuzzy:
+        logger.warning(f"Queue-Times ride {ride_id} ({name!r}) resembles {matched!r}, not saving the match")
+    elif ride_id is not None:
+        get_ride_ids()[ride_id] = {"slug": slug, "name": name}
+        _ride_ids_changed = True
+        logger.info(f"Mapped Queue-Times ride {ride_id} ({name!r}) to {slug}")
+    return slug, matched
+
+
+def aggregate_tracks(name: str, rides: List[dict]) -> dict:
+    """
+    One wait times entry for the Queue-Times rides matched to one attraction. A single ride
+    is taken as is. Several tracks (Joris en de Draak: Vuur and Water) are open if any is,
+    wait_time is the shortest open queue and wait_time_max the longest, with each track listed.
+    """
+    entries = [{
+        "name": name,
+        "original_name": ride.get("name", ""),
+        "is_open": ride.get("is_open", False),
+        "wait_time": ride.get("wait_time", 0),
+        "last_updated": ride.get("last_updated"),
+    } for ride in rides]
+    if len(entries) == 1:
+        return entries[0]
+    waits = [e["wait_time"] for e in entries if e["is_open"]] or [e["wait_time"] for e in entries]
+    return {
+        "name": name,
+        "original_name": " / ".join(e["original_name"] for e in entries),
+        "is_open": any(e["is_open"] for e in entries),
+        "wait_time": min(waits),
+        "wait_time_max": max(waits),
+        "last_updated": max((e["last_updated"] for e in entries if e["last_updated"]), default=None),
+        "tracks": [{key: e[key] for key in ("original_name", "is_open", "wait_time")} for e in entries],
+    }
+
+
+def parse_wait_times(data: dict) -> Dict[str, dict]:
+    """Queue-Times park response -> {ride key: entry}, rides in lands and outside them"""
+    rides = [ride for land in data.get("lands", []) for ride in land.get("rides", [])]
+    rides += data.get("rides", [])
+    grouped, names, seen = {}, {}, set()
+    for ride in rides:
+        ride_id = ride.get("id", ride.get("name"))
+        if ride_id in seen:
+            continue  # listed twice
+        seen.add(ride_id)
+        key, names[key] = ride_key(ride)
+        grouped.setdefault(key, []).append(ride)
+    return {key: aggregate_tracks(names[key], tracks) for key, tracks in grouped.items()}
+
 
 def fetch_wait_times() -> Optional[dict]:
     """Fetch current wait times from Queue-Times.com API"""
+    import requests  # ~100 ms to import, only needed for the actual fetch
+
     try:
         logger.info(f"Fetching wait times from {QUEUE_TIMES_API}")
         
         response = requests.get(
             QUEUE_TIMES_API,
             headers={"User-Agent": "Efteling-Height-Checker/1.0"},
-            timeout=30
+            timeout=(CONNECT_TIMEOUT, 30)
         )
         response.raise_for_status()
         
         data = response.json()
         
-        # Parse the response
-        wait_times = {}
-        park_open = False
-        
-        for land in data.get("lands", []):
-            for ride in land.get("rides", []):
-                name = ride.get("name", "")
-                mapped_name = NAME_MAPPING.get(name, name)
-                
-                wait_times[mapped_name] = {
-                    "original_name": name,
-                    "is_open": ride.get("is_open", False),
-                    "wait_time": ride.get("wait_time", 0),
-                    "last_updated": ride.get("last_updated"),
-                }
-                
-                if ride.get("is_open"):
-                    park_open = True
-        
-        # Also check rides not in lands
-        for ride in data.get("rides", []):
-            name = ride.get("name", "")
-            mapped_name = NAME_MAPPING.get(name, name)
-            
-            wait_times[mapped_name] = {
-                "original_name": name,
-                "is_open": ride.get("is_open", False),
-                "wait_time": ride.get("wait_time", 0),
-                "last_updated": ride.get("last_updated"),
-            }
-            
-            if ride.get("is_open"):
-                park_open = True
+        wait_times = parse_wait_times(data)
+        save_ride_ids()
+        park_open = any(wt["is_open"] for wt in wait_times.values())
         
         result = {
             "wait_times": wait_times,
@@ -127,57 +184,78 @@ def fetch_wait_times() -> Optional[dict]:
         return None
 
 
+def probe() -> bool:
+    """Probe Queue-Times.com if its breaker is half open (leader.probe_upstreams); True if that closed it"""
+    breaker = CircuitBreaker.for_url(QUEUE_TIMES_API)
+    if breaker.state != "half_open":
+        return False
+    logger.info(f"Probing {breaker.host} after the cool-down")
+    if fetch_wait_times() is None:
+        breaker.record_failure()
+        return False
+    return breaker.record_success()  # the next scheduled fetch stores the wait times
+
+
 def save_wait_times(data: dict) -> None:
-    """Save wait times to JSON file"""
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    
-    with open(WAIT_TIMES_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
-    
-    logger.info(f"Saved wait times to {WAIT_TIMES_FILE}")
+    """Save wait times to the configured storage backend"""
+    get_storage().save_wait_times(data)
+    logger.info("Saved wait times")
 
 
 def load_wait_times() -> Optional[dict]:
-    """Load wait times from JSON file"""
-    if WAIT_TIMES_FILE.exists():
-        with open(WAIT_TIMES_FILE) as f:
-            return json.load(f)
-    return None
+    """Load wait times from the configured storage backend"""
+    return get_storage().load_wait_times()
+
+
+# Fields that make up a ride's observable state, including the aggregate of a ride
+# with several tracks (aggregate_tracks). Queue-Times bumps last_updated on every
+# poll, so it is carried along but never compared.
+DELTA_FIELDS = ("is_open", "wait_time", "wait_time_max", "tracks")
 
 
-def categorize_by_height(attractions: list, height_cm: int) -> dict:
+def diff_wait_times(previous: Optional[dict], current: dict) -> Dict[str, Optional[dict]]:
     """
-    Categorize attractions by availability for a given height.
-    (Duplicated from scraper.py for independence)
+    Compute the per-ride delta between two wait time snapshots.
+    
+    Returns {ride_key: new_entry} for rides that appeared or changed and
+    {ride_key: None} for rides that disappeared. An empty dict means nothing changed.
     """
-    result = {'independent': [], 'with_companion': [], 'not_available': []}
+    old_rides = (previous or {}).get("wait_times", {})
+    new_rides = current.get("wait_times", {})
+    delta = {}
     
-    for attr in attractions:
-        min_h = attr.get("min_height_cm")
-        supervision_h = attr.get("supervision_height_cm")
-        
-        if min_h is None and supervision_h is None:
-            result['independent'].append(attr)
-        elif min_h is None and supervision_h is not None:
-            if height_cm >= supervision_h:
-                result['independent'].append(attr)
-            else:
-                result['with_companion'].append(attr)
-        elif min_h is not None:
-            if height_cm >= min_h:
-                result['independent'].append(attr)
-            elif supervision_h is not None and height_cm >= supervision_h:
-                result['with_companion'].append(attr)
-            else:
-                result['not_available'].append(attr)
+    for name, entry in new_rides.items():
+        old = old_rides.get(name)
+        if old is None or any(old.get(f) != entry.get(f) for f in DELTA_FIELDS):
+            delta[name] = entry
     
-    return result
+    for name in old_rides:
+        if name not in new_rides:
+            delta[name] = None
+    
+    return delta
+
+
+def attractions_need_merge() -> bool:
+    """True when attractions.json was rewritten by the scraper and lost its merged wait times"""
+    storage = get_storage()
+    if storage.joins_wait_times:
+        return False
+    if storage.generation() is None:
+        return False
+    return "wait_times_info" not in storage.load_data(sections=["wait_times_info"])
 
 
 def merge_wait_times_with_attractions() -> None:
     """Merge wait times into the main attractions data and regenerate height categories"""
-    if not ATTRACTIONS_FILE.exists():
-        logger.warning("Attractions file not found, skipping merge")
+    storage = get_storage()
+    if storage.joins_wait_times:
+        logger.info("Storage joins wait times at read time, no merge needed")
+        return
+    
+    attractions_data = storage.load_data()
+    if attractions_data is None:
+        logger.warning("Attractions data not found, skipping merge")
         return
     
     wait_data = load_wait_times()
@@ -185,16 +263,12 @@ def merge_wait_times_with_attractions() -> None:
         logger.warning("No wait times data to merge")
         return
     
-    with open(ATTRACTIONS_FILE) as f:
-        attractions_data = json.load(f)
-    
     wait_times = wait_data.get("wait_times", {})
     
-    # Add wait times to each attraction
+    # Add wait times to each attraction, joined on the slug
     for attr in attractions_data.get("attractions", []):
-        name = attr.get("name")
-        if name in wait_times:
-            wt = wait_times[name]
+        wt = wait_times.get(attraction_slug(attr))
+        if wt is not None:
             attr["is_open"] = wt.get("is_open", False)
             attr["wait_time"] = wt.get("wait_time", 0) if wt.get("is_open") else None
             attr["wait_last_updated"] = wt.get("last_updated")
@@ -203,12 +277,10 @@ def merge_wait_times_with_attractions() -> None:
             attr["wait_time"] = None
             attr["wait_last_updated"] = None
     
-    # IMPORTANT: Regenerate height_categories with updated attraction data (including wait times)
-    attractions_list = attractions_data.get("attractions", [])
-    attractions_data["height_categories"] = {
-        str(h): categorize_by_height(attractions_list, h) 
-        for h in [95, 100, 110, 120, 130, 135, 140]
-    }
+    # Height ranges only depend on the heights; rebuilding them also migrates documents
+    # still carrying the old per-height attraction copies
+    attractions_data.pop("height_categories", None)
+    attractions_data["height_ranges"] = height_ranges(attractions_data.get("attractions", []))
     
     # Add wait time metadata
     attractions_data["wait_times_info"] = {
@@ -218,8 +290,7 @@ def merge_wait_times_with_attractions() -> None:
         "attribution": wait_data.get("attribution"),
     }
     
-    with open(ATTRACTIONS_FILE, 'w') as f:
-        json.dump(attractions_data, f, indent=2)
+    storage.save_data(attractions_data)
     
     logger.info("Merged wait times with attractions data and regenerated height categories")
 
@@ -227,26 +298,55 @@ def merge_wait_times_with_attractions() -> None:
 def main():
     """Main function to fetch and save wait times"""
     logger.info("Starting wait times fetcher")
+    if not is_leader():
+        logger.info("Another replica is the leader, skipping the fetch")
+        print("⏭️ Another replica fetches the wait times")
+        return 0
+    
+    breaker = CircuitBreaker.for_url(QUEUE_TIMES_API)
+    if not breaker.allow():
+        logger.warning(f"Circuit for {breaker.host} is open until {breaker.retry_at():%H:%M:%S} UTC, "
+                       f"keeping the last wait times")
+        print("⏸️ Queue-Times.com unreachable, keeping the last wait times")
+        return 1
     
     data = fetch_wait_times()
     
     if data:
-        save_wait_times(data)
-        merge_wait_times_with_attractions()
+        # Closing the breaker clears the stale mark, which needs a publish of its own if nothing else changed
+        recovered = breaker.record_success()
+        delta = diff_wait_times(load_wait_times(), data)
+        
+        if delta:
+            logger.info(f"Wait times changed for {len(delta)} attractions")
+            save_wait_times(data)
+            merge_wait_times_with_attractions()
+            # Readers get the change through the snapshot's change log entry (/api/changes)
+            publish_snapshot()
+        elif attractions_need_merge():
+            # No ride changed, but a fresh scrape dropped the merged wait times
+            logger.info("Wait times unchanged, re-merging into rescraped attractions")
+            merge_wait_times_with_attractions()
+            publish_snapshot()
+        elif recovered:
+            publish_snapshot()
+        else:
+            logger.info("Wait times unchanged, skipping write")
         
         # Print summary
         wait_times = data.get("wait_times", {})
-        open_rides = [name for name, wt in wait_times.items() if wt.get("is_open")]
+        open_rides = sorted(((wt.get("name", key), wt) for key, wt in wait_times.items() if wt.get("is_open")), key=lambda item: item[0])
         
         if open_rides:
             print(f"\n🎢 Park is OPEN - {len(open_rides)} attractions operating")
             print("\nCurrent wait times:")
-            for name in sorted(open_rides):
-                wt = wait_times[name]
+            for name, wt in open_rides:
                 print(f"  {name}: {wt['wait_time']} min")
         else:
             print("\n🌙 Park is CLOSED")
     else:
+        if breaker.record_failure():
+            publish_snapshot()  # mark the wait times stale
         print("❌ Failed to fetch wait times")
         return 1
     
@@ -254,4 +354,5 @@ def main():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     exit(main())